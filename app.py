@@ -1,8 +1,23 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS  # Import CORS
-from src.models.run_converstaion import run_conversation
+from src.services.run_converstaion import run_conversation
+from src.services.stream_conversation import stream_conversation
+from src.services.prompts import DEFAULT_INTRODUCTION
+from src.services.answer_cache import answer_cache, data_version, ANSWER_CACHE_ENABLED
+from src.services.session_store import create_session_store, new_session_id
+from src.services.multi_site import MultiSiteAPI, MULTI_SITE_INTRODUCTION
+from src.services.warmup import warm_up
+from src.services.routing import route_query
+from src.services.batch import iter_batch, BATCH_MAX_CONCURRENCY
+from src.util.api_factory import build_api
+from src.util.cache import api_cache, invalidate_site
+from src.util.site_snapshot import drop_snapshot
+from src.util.incremental import drop_collections
+from src.util.metrics import start_trace, end_trace, render_metrics, HTTP_REQUESTS, PAYLOAD_BYTES
+from src.util.admission import Overloaded, start_budget, end_budget, REQUEST_TIME_BUDGET
 from dotenv import load_dotenv
 import os
+import json
 import openai
 
 load_dotenv()
@@ -11,6 +26,53 @@ GPT_API_KEY = os.getenv('OPENAI_API_KEY')
 app = Flask(__name__)
 CORS(app)
 
+session_store = create_session_store()
+
+# Build the tool schemas, model client and connection pools before the first query arrives
+warm_up.start(GPT_API_KEY)
+
+@app.before_request
+def begin_request_trace():
+    g.trace, g.trace_token = start_trace()
+    # Wall-clock budget for the whole request; a query body can ask for a different one with "time_budget"
+    data = request.get_json(silent=True) if request.is_json else None
+    g.budget_token = start_budget((data or {}).get('time_budget', REQUEST_TIME_BUDGET))
+
+@app.after_request
+def record_request_metrics(response):
+    HTTP_REQUESTS.inc(endpoint=request.endpoint or "unknown", status=response.status_code)
+    if request.content_length:
+        PAYLOAD_BYTES.observe(request.content_length, direction="request")
+    if not response.is_streamed and response.content_length:
+        PAYLOAD_BYTES.observe(response.content_length, direction="response")
+    return response
+
+@app.teardown_request
+def finish_request_trace(exc):
+    token = g.pop('budget_token', None)
+    if token is not None:
+        end_budget(token)
+    token = g.pop('trace_token', None)
+    if token is not None:
+        end_trace(token)
+
+@app.errorhandler(Overloaded)
+def reject_overloaded(error):
+    # Shed load quickly instead of queueing behind a saturated upstream
+    response = jsonify({"error": str(error), "upstream": error.upstream, "reason": error.reason})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(max(1, int(error.retry_after)))
+    return response
+
+@app.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/ready')
+def ready():
+    # Readiness probe: 503 until warm-up has finished, so traffic is only routed to a warm process
+    return jsonify(warm_up.status()), 200 if warm_up.ready else 503
+
 @app.route('/openai-version')
 def openai_version():
     return "OpenAI library version: " + openai.__version__
@@ -31,6 +93,22 @@ def require_api_key(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def build_query_api(data, GPT_Introduction):
+    """
+    Build the API for a query: one site from site_id, or a fan-out over every site in site_ids.
+
+    Returns:
+        tuple: (api, answer-cache site key, introduction with the multi-site preamble added when needed)
+    """
+    site_ids = data.get('site_ids')
+    if site_ids:
+        api = MultiSiteAPI(site_ids, build=build_api)
+        site_key = ",".join(sorted(str(site_id) for site_id in site_ids))
+        return api, site_key, GPT_Introduction + MULTI_SITE_INTRODUCTION.format(site_ids=", ".join(map(str, site_ids)))
+
+    site_id = data.get('site_id')
+    return build_api(site_id), site_id, GPT_Introduction
+
 
 @app.route('/query', methods=['POST'])
 # @require_api_key
@@ -38,49 +116,173 @@ def process_query():
     data = request.get_json()
     user_query = data.get('query')
     max_depth = data.get('max_depth', 5)
-    session_messages = data.get('session_messages')
-    site_id = data.get('site_id')
 
-    from src.util.database_API_connection import ApplicationAPI
+    # Clients that still send the whole history get the legacy round-trip contract.
+    # Everyone else gets a server-side session keyed by session_id.
+    legacy = 'session_messages' in data
+    if legacy:
+        session_id = None
+        session_messages = data.get('session_messages')
+    else:
+        session_id = data.get('session_id') or new_session_id()
+        session_messages = session_store.load(session_id) or []
+
+    # Use provided introduction if available, otherwise use the default
+    GPT_Introduction = data.get('introduction', DEFAULT_INTRODUCTION)
+    api, site_id, GPT_Introduction = build_query_api(data, GPT_Introduction)
+
+    # Opening questions asked with the default introduction can be answered from the answer cache
+    version = None
+    if ANSWER_CACHE_ENABLED and not session_messages and 'introduction' not in data:
+        version = data_version(api)
+    cached_answer, cache_match = answer_cache.lookup(site_id, version, user_query) if version is not None else (None, None)
+
+    context_stats = []
+    result_stats = []
+    route = None
+    if cached_answer is not None:
+        # Skip the model and the backend entirely, but keep the history as if the loop had run
+        session_messages = [{"role": "system", "content": GPT_Introduction}, {"role": "user", "content": user_query}]
+        message_content = cached_answer
+    else:
+        # Choose the tools and model tier for the query, then run the conversation function from utils
+        route = route_query(user_query)
+        outcome = {}
+        response, session_messages = run_conversation(api, user_query, GPT_Introduction, max_depth, GPT_API_KEY, session_messages,
+                                                      context_stats=context_stats, result_stats=result_stats, route=route,
+                                                      outcome=outcome)
+
+        # Formatting the final message content for output
+        message_content = response.choices[0].message.content if response else "No response generated."
 
-    api = ApplicationAPI(site_id)
+        # Answers built around failed tool calls or cut short by the budget are not shared with later users
+        if version is not None and response and not outcome["tool_errors"] and not outcome["budget_stopped"]:
+            answer_cache.store(site_id, version, user_query, message_content)
 
-    # Default introduction text
-    default_introduction = """The system manages a database of reports and assets for various sites. Each site contains multiple assets, and each asset is linked to specific systems. 
-    Reports generated for these systems contain critical data points, including severity levels that indicate the importance of the information (0=no warning, 1=early warning, 2=advanced warning).
-    The API provides access to these reports, assets, and system details, enabling in-depth data analysis.
-    
-    As part of your response I would like you to suggest hyperlinks to different parts of the front end. Here is the EXACT LINKS:
+    if legacy:
+        body = {
+            "response": message_content,
+            "conversation": session_messages,
+            "context": context_stats,
+            "results": result_stats,
+            "route": route.summary() if route else None,
+            "cached": cache_match
+        }
+    else:
+        assistant_message = {"role": "assistant", "content": message_content}
+        session_messages.append(assistant_message)
+        session_store.save(session_id, session_messages)
 
+        body = {
+            "response": message_content,
+            "session_id": session_id,
+            "message": assistant_message,
+            "context": context_stats,
+            "results": result_stats,
+            "route": route.summary() if route else None,
+            "cached": cache_match
+        }
 
-- **Asset Information**: Use the asset ID only. Format: `http://localhost:4200/sites/summary?view=asset&asset_id={assetId}`
-- **Report Information**: This requires only the report ID number. Format: `http://localhost:4200/sites/summary/{reportId}`
-- **Report Data Trend Analysis**: General link, no ID required. `http://localhost:4200/sites/analytics`
-- **Report Data Table Showing Most Recent Data**: General link, no ID required. `http://localhost:4200/sites/comparison`
-- **Summary of All Reports for User to View**: General link, no ID required. `http://localhost:4200/sites/summary?view=total`
-- **Homepage for Site**: General link, no ID required. `http://localhost:4200/sites/home`
-- **Page to pick a site for analysis**: General link, no ID required. `http://localhost:4200/sites`
-- **Page to see all comments**: General link, no ID required. `http://localhost:4200/sites/comments`
-- **Page to upload files into**: General link, no ID required. `http://localhost:4200/sites/upload`
+    # Optional per-request timing breakdown
+    if data.get('timing'):
+        body["timing"] = g.trace.summary()
 
+    return jsonify(body)
 
-    Please as much as possible use EXACT HYPERLINKS to guide to user to more information on the site.
+def format_sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
 
+@app.route('/query/stream', methods=['POST'])
+# @require_api_key
+def process_query_stream():
+    """Same request as /query, answered as server-sent events: tool progress first, then the answer token by token."""
+    data = request.get_json()
+    user_query = data.get('query')
+    max_depth = data.get('max_depth', 5)
+    GPT_Introduction = data.get('introduction', DEFAULT_INTRODUCTION)
+
+    legacy = 'session_messages' in data
+    if legacy:
+        session_id = None
+        session_messages = data.get('session_messages') or []
+    else:
+        session_id = data.get('session_id') or new_session_id()
+        session_messages = session_store.load(session_id) or []
+
+    api, _, GPT_Introduction = build_query_api(data, GPT_Introduction)
+
+    def generate():
+        yield format_sse("session", {"session_id": session_id})
+        try:
+            for event, payload in stream_conversation(api, user_query, GPT_Introduction, max_depth, GPT_API_KEY, session_messages):
+                if event == "done":
+                    message_content = payload["response"] or "No response generated."
+                    payload["response"] = message_content
+                    payload["session_id"] = session_id
+                    if legacy:
+                        # Legacy clients keep the history themselves, so they get it back as /query returns it
+                        payload["conversation"] = session_messages
+                    else:
+                        session_messages.append({"role": "assistant", "content": message_content})
+                        session_store.save(session_id, session_messages)
+                yield format_sse(event, payload)
+        except Exception as e:
+            yield format_sse("error", {"message": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route('/query/batch', methods=['POST'])
+# @require_api_key
+def process_query_batch():
     """
+    Answer many queries for one site, sharing one API and its cache, and stream one JSON line per query as it finishes.
 
-    # Use provided introduction if available, otherwise use the default
-    GPT_Introduction = data.get('introduction', default_introduction)
+    The body has site_id and queries (strings or {"id", "query"} objects), plus optional max_depth, max_concurrency
+    and skip_ids. Clients resuming an interrupted batch pass the ids they already have results for as skip_ids.
+    """
+    data = request.get_json()
+    queries = data.get('queries') or []
+    max_depth = data.get('max_depth', 5)
+    max_concurrency = min(int(data.get('max_concurrency', BATCH_MAX_CONCURRENCY)), BATCH_MAX_CONCURRENCY)
+    api = build_api(data.get('site_id'))
 
-    # Running the conversation function from utils
-    response, session_messages = run_conversation(api, user_query, GPT_Introduction, max_depth, GPT_API_KEY, session_messages)
+    def generate():
+        try:
+            for record in iter_batch(api, queries, max_depth, GPT_API_KEY, max_concurrency, data.get('skip_ids') or ()):
+                yield json.dumps(record) + "\n"
+        except ValueError as e:
+            yield json.dumps({"status": "error", "error": str(e)}) + "\n"
 
-    # Formatting the final message content for output
-    message_content = response['choices'][0]['message']['content'] if response else "No response generated."
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
-    return jsonify({
-        "response": message_content,
-        "conversation": session_messages
-    })
+@app.route('/session/<session_id>', methods=['DELETE'])
+# @require_api_key
+def delete_session(session_id):
+    session_store.delete(session_id)
+    return jsonify({"deleted": session_id})
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(api_cache.stats())
+
+@app.route('/cache/invalidate', methods=['POST'])
+# @require_api_key
+def cache_invalidate():
+    # Called by the backend when a report is uploaded so the next query sees the new data
+    data = request.get_json(silent=True) or {}
+    site_id = data.get('site_id')
+    if site_id is None:
+        removed = api_cache.invalidate()
+    else:
+        removed = invalidate_site(site_id)
+    drop_collections(site_id)
+    drop_snapshot(site_id)
+    answer_cache.invalidate_site(site_id)
+    return jsonify({"invalidated": removed})
 
 if __name__ == "__main__":
     app.run(port=3060)
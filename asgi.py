@@ -0,0 +1,193 @@
+"""
+ASGI entry point serving the same /query contract as app.py on the async pipeline.
+
+Run with any ASGI server, e.g.:
+
+    uvicorn asgi:app --port 3060
+
+Each in-flight query waits on the event loop rather than holding a thread, so one process can keep
+hundreds of mostly idle conversations open.
+"""
+import os
+import json
+import asyncio
+import logging
+
+from dotenv import load_dotenv
+
+from src.services.async_run_conversation import run_conversation_async
+from src.services.prompts import DEFAULT_INTRODUCTION
+from src.services.routing import route_query
+from src.services.session_store import create_session_store, new_session_id
+from src.services.answer_cache import answer_cache, data_version_async, ANSWER_CACHE_ENABLED
+from src.services.multi_site import AsyncMultiSiteAPI, MULTI_SITE_INTRODUCTION
+from src.services.model_client import close_async_model_clients
+from src.services.warmup import warm_up
+from src.util.async_database_API_connection import build_async_api, close_async_clients
+from src.util.metrics import start_trace, end_trace, render_metrics, HTTP_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+GPT_API_KEY = os.getenv('OPENAI_API_KEY')
+
+session_store = create_session_store()
+
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-headers", b"Content-Type, Authorization"),
+    (b"access-control-allow-methods", b"POST, OPTIONS"),
+]
+
+
+async def send_json(send, payload, status=200):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())] + CORS_HEADERS,
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def build_query_api(data, GPT_Introduction):
+    """Async version of app.build_query_api: one site from site_id, or a fan-out over every site in site_ids."""
+    site_ids = data.get('site_ids')
+    if site_ids:
+        api = AsyncMultiSiteAPI(site_ids, build=build_async_api)
+        site_key = ",".join(sorted(str(site_id) for site_id in site_ids))
+        return api, site_key, GPT_Introduction + MULTI_SITE_INTRODUCTION.format(site_ids=", ".join(map(str, site_ids)))
+
+    site_id = data.get('site_id')
+    return build_async_api(site_id), site_id, GPT_Introduction
+
+
+async def process_query(data):
+    """Async version of app.process_query, with the same request and response bodies."""
+    user_query = data.get('query')
+    max_depth = data.get('max_depth', 5)
+
+    legacy = 'session_messages' in data
+    if legacy:
+        session_id = None
+        session_messages = data.get('session_messages')
+    else:
+        session_id = data.get('session_id') or new_session_id()
+        # Stores other than the memory one do blocking I/O, so they run off the event loop
+        session_messages = await asyncio.to_thread(session_store.load, session_id) or []
+
+    GPT_Introduction = data.get('introduction', DEFAULT_INTRODUCTION)
+    api, site_id, GPT_Introduction = build_query_api(data, GPT_Introduction)
+
+    version = None
+    if ANSWER_CACHE_ENABLED and not session_messages and 'introduction' not in data:
+        version = await data_version_async(api)
+    cached_answer, cache_match = answer_cache.lookup(site_id, version, user_query) if version is not None else (None, None)
+
+    context_stats = []
+    result_stats = []
+    route = None
+    if cached_answer is not None:
+        session_messages = [{"role": "system", "content": GPT_Introduction}, {"role": "user", "content": user_query}]
+        message_content = cached_answer
+    else:
+        route = route_query(user_query)
+        outcome = {}
+        response, session_messages = await run_conversation_async(api, user_query, GPT_Introduction, max_depth, GPT_API_KEY,
+                                                                  session_messages, context_stats=context_stats,
+                                                                  result_stats=result_stats, route=route, outcome=outcome)
+        message_content = response.choices[0].message.content if response else "No response generated."
+        if version is not None and response and not outcome["tool_errors"] and not outcome["budget_stopped"]:
+            answer_cache.store(site_id, version, user_query, message_content)
+
+    body = {
+        "response": message_content,
+        "context": context_stats,
+        "results": result_stats,
+        "route": route.summary() if route else None,
+        "cached": cache_match,
+    }
+    if legacy:
+        body["conversation"] = session_messages
+        return body
+
+    assistant_message = {"role": "assistant", "content": message_content}
+    session_messages.append(assistant_message)
+    await asyncio.to_thread(session_store.save, session_id, session_messages)
+    body.update(session_id=session_id, message=assistant_message)
+    return body
+
+
+async def traced_query(data):
+    """Run process_query inside a fresh trace, adding the timing breakdown when the request asks for it."""
+    trace, token = start_trace()
+    try:
+        body = await process_query(data)
+    finally:
+        end_trace(token)
+    if data.get('timing'):
+        body["timing"] = trace.summary()
+    return body
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                warm_up.start(GPT_API_KEY)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await close_async_clients()
+                await close_async_model_clients()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        return
+
+    method, path = scope["method"], scope["path"]
+
+    if method == "OPTIONS":
+        await send({"type": "http.response.start", "status": 204, "headers": CORS_HEADERS})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    if path == "/query" and method == "POST":
+        try:
+            data = json.loads(await read_body(receive) or b"{}")
+        except ValueError:
+            await send_json(send, {"error": "Request body must be JSON"}, 400)
+            return
+        try:
+            body = await traced_query(data)
+        except Exception as e:
+            # Answer with JSON and the CORS headers, as Flask does, instead of letting the server drop the connection
+            logger.exception("Query failed")
+            await send_json(send, {"error": str(e)}, 500)
+            HTTP_REQUESTS.inc(endpoint="process_query", status=500)
+            return
+        await send_json(send, body)
+        HTTP_REQUESTS.inc(endpoint="process_query", status=200)
+        return
+
+    if path == "/ready" and method == "GET":
+        await send_json(send, warm_up.status(), 200 if warm_up.ready else 503)
+        return
+
+    if path == "/metrics" and method == "GET":
+        body = render_metrics().encode("utf-8")
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain; version=0.0.4")]})
+        await send({"type": "http.response.body", "body": body})
+        return
+
+    await send_json(send, {"error": "Not found"}, 404)
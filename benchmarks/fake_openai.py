@@ -0,0 +1,127 @@
+"""
+Scripted stand-in for the OpenAI chat completions endpoint.
+
+Each conversation replays the same script: a list of steps, each either a list of tool calls or the final answer.
+The step is chosen from the number of tool results that follow the latest user message, so the server is
+stateless and any number of conversations can run against it at once.
+"""
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Typical "compare the worst assets" conversation: one site-wide read, a fan-out of report lookups, then the answer
+DEFAULT_SCRIPT = [
+    {"tool_calls": [{"name": "get_all_asset_severity_data", "arguments": {}}]},
+    {"tool_calls": [
+        {"name": "get_all_report_data_from_asset_names", "arguments": {"assetName": "F1"}},
+        {"name": "get_all_report_data_from_asset_names", "arguments": {"assetName": "F2"}},
+        {"name": "get_all_report_data_from_asset_names", "arguments": {"assetName": "F7"}},
+    ]},
+    {"tool_calls": [{"name": "get_single_report_data", "arguments": {"reportID": str(report_id)}} for report_id in (1, 2, 3, 4, 5)]},
+    {"content": "F1 has the most advanced warnings. See http://localhost:4200/sites/summary?view=asset&asset_id=1 for details."},
+]
+
+
+def is_tool_result(message):
+    return message.get("role") == "tool" or (message.get("role") == "system" and "name" in message)
+
+
+class FakeOpenAI:
+    """Threaded HTTP server answering POST /v1/chat/completions from a script."""
+
+    def __init__(self, script=None, host="127.0.0.1", port=0, latency_ms=0):
+        self.script = script or DEFAULT_SCRIPT
+        self.latency = latency_ms / 1000.0
+        self.requests = 0
+        self.request_bytes = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.request_bytes = []
+
+    def step_for(self, messages):
+        last_user = max((i for i, message in enumerate(messages) if message.get("role") == "user"), default=-1)
+        results = sum(1 for message in messages[last_user + 1:] if is_tool_result(message))
+        for step in self.script:
+            calls = step.get("tool_calls")
+            if not calls:
+                return step
+            if results < len(calls):
+                return step
+            results -= len(calls)
+        return self.script[-1]
+
+    def completion(self, body, raw_size):
+        step = self.step_for(body.get("messages", []))
+        prompt_tokens = raw_size // 4
+        if step.get("tool_calls"):
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {"id": f"call_{i}", "type": "function",
+                     "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])}}
+                    for i, call in enumerate(step["tool_calls"])
+                ],
+            }
+            finish_reason, completion_tokens = "tool_calls", 20 * len(step["tool_calls"])
+        else:
+            message = {"role": "assistant", "content": step["content"]}
+            finish_reason, completion_tokens = "stop", len(step["content"]) // 4
+        return {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with fake._lock:
+                    fake.requests += 1
+                    fake.request_bytes.append(len(raw))
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                if fake.latency:
+                    time.sleep(fake.latency)
+                body = json.dumps(fake.completion(json.loads(raw), len(raw))).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-openai", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
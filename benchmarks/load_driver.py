@@ -0,0 +1,142 @@
+"""
+Offline load test for /query.
+
+Starts the stub backend, the scripted fake model and the Flask app in-process on localhost, then drives
+concurrent queries and reports throughput, latency percentiles, backend calls per query and model request bytes
+per turn. Nothing leaves the machine.
+
+    python -m benchmarks.load_driver --queries 200 --concurrency 16 --backend-latency-ms 20 --model-latency-ms 200
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_backend import StubBackend
+from benchmarks.fake_openai import FakeOpenAI
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def start_app(backend_url, model_url):
+    """Import the Flask app against the local stubs and serve it on a free port. Returns (server, base URL)."""
+    # The app reads its configuration at import time, so point it at the stubs first
+    os.environ["BACKEND_BASE_URL"] = backend_url
+    os.environ["OPENAI_BASE_URL"] = model_url
+    os.environ["OPENAI_API_KEY"] = "offline-benchmark"
+    # Every measured query is the same question, so the answer cache would serve all of them without a model turn
+    os.environ["ANSWER_CACHE_ENABLED"] = "0"
+
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-app", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def post_query(app_url, site_id, query, max_depth):
+    body = json.dumps({"query": query, "site_id": site_id, "max_depth": max_depth}).encode("utf-8")
+    request = urllib.request.Request(f"{app_url}/query", data=body, headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=120) as response:
+        payload = response.read()
+    return time.perf_counter() - started, len(payload)
+
+
+def run(args):
+    backend = StubBackend(latency_ms=args.backend_latency_ms, n_assets=args.assets, n_systems=args.systems,
+                          n_reports=args.reports, n_comments=args.comments).start()
+    script = None
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+    model = FakeOpenAI(script=script, latency_ms=args.model_latency_ms).start()
+    server, app_url = start_app(backend.base_url, model.base_url)
+
+    def one(i):
+        site_id = (i % args.sites) + 1
+        try:
+            latency, size = post_query(app_url, site_id, args.query, args.max_depth)
+            return latency, size, None
+        except Exception as e:
+            return None, 0, str(e)
+
+    try:
+        for i in range(args.warmup):
+            one(i)
+        backend.reset_calls()
+        model.reset()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(one, range(args.queries)))
+        wall = time.perf_counter() - started
+    finally:
+        server.shutdown()
+        model.stop()
+        backend.stop()
+
+    latencies = [latency for latency, _, error in results if error is None]
+    errors = [error for _, _, error in results if error is not None]
+    report = {
+        "queries": args.queries,
+        "concurrency": args.concurrency,
+        "errors": len(errors),
+        "throughput_qps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(max(latencies) * 1000, 1) if latencies else 0.0,
+        },
+        "backend_calls_per_query": round(backend.total_calls() / args.queries, 2),
+        "backend_calls_by_route": dict(backend.calls.most_common()),
+        "model_turns_per_query": round(model.requests / args.queries, 2),
+        "model_request_bytes_per_turn": round(sum(model.request_bytes) / len(model.request_bytes)) if model.request_bytes else 0,
+        "response_bytes_per_query": round(sum(size for _, size, _ in results) / args.queries),
+    }
+    if errors:
+        report["first_error"] = errors[0]
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline /query load test against a stub backend and scripted model.")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--sites", type=int, default=1, help="Number of synthetic sites queries are spread over")
+    parser.add_argument("--assets", type=int, default=60)
+    parser.add_argument("--systems", type=int, default=8)
+    parser.add_argument("--reports", type=int, default=1500)
+    parser.add_argument("--comments", type=int, default=300)
+    parser.add_argument("--backend-latency-ms", type=float, default=10)
+    parser.add_argument("--model-latency-ms", type=float, default=100)
+    parser.add_argument("--max-depth", type=int, default=5)
+    parser.add_argument("--query", default="Compare F1, F2 and F7 and tell me which is most severe.")
+    parser.add_argument("--script", help="JSON file with the fake model's tool-call script")
+    parser.add_argument("--output", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+Local stand-in for the /api/v1 backend, serving synthetic sites of a configurable size and latency.
+
+Every route ApplicationAPI calls is implemented. Requests are counted per route so the load driver can report
+backend calls per query. Responses carry an ETag and answer If-None-Match with 304, and the reports and comments
+collections honour the afterId watermark.
+"""
+import re
+import json
+import time
+import zlib
+import random
+import threading
+from urllib.parse import parse_qs, urlsplit
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SYSTEM_NAMES = [
+    "Hydraulic Pitch Station", "Gearbox", "Blade Bearing A", "Blade Bearing B", "Blade Bearing C",
+    "Main Bearing", "Yaw Gear", "Generator", "Transformer", "Cooling System",
+]
+
+
+class SyntheticSite:
+    """Deterministic fake data for one site."""
+
+    def __init__(self, site_id, n_assets=60, n_systems=8, n_reports=1500, n_comments=300, seed=0):
+        rng = random.Random(seed + int(site_id))
+        self.site_id = int(site_id)
+        self.assets = [{'id': i, 'name': f"F{i}", 'location': f"Site {site_id} F{i:02d}"} for i in range(1, n_assets + 1)]
+        self.systems = [
+            {'system_id': i, 'name': SYSTEM_NAMES[(i - 1) % len(SYSTEM_NAMES)] + ("" if i <= len(SYSTEM_NAMES) else f" {i}")}
+            for i in range(1, n_systems + 1)
+        ]
+        self.reports = []
+        for report_id in range(1, n_reports + 1):
+            asset = rng.choice(self.assets)
+            system = rng.choice(self.systems)
+            severity = rng.choices([0, 1, 2], weights=[6, 3, 1])[0]
+            self.reports.append({
+                'id': report_id,
+                'date': f"{2021 + report_id * 3 // n_reports:04d}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                'fileType': 'application/pdf',
+                'asset': {'id': asset['id'], 'name': asset['name']},
+                'systems': {'system_id': system['system_id'], 'name': system['name']},
+                'severity': {'sev_id': report_id, 'severity': severity, 'severity_count': rng.randint(0, 6) if severity else 0},
+            })
+        self.reports_by_id = {report['id']: report for report in self.reports}
+        self.comments = [
+            {'id': i, 'entityType': rng.choice(['asset', 'report']), 'entityId': rng.randint(1, max(n_reports, 1)),
+             'comment': f"Synthetic comment {i}", 'date': self.reports[i % len(self.reports)]['date'] if self.reports else None}
+            for i in range(1, n_comments + 1)
+        ]
+
+    def report_detail(self, report_id):
+        report = self.reports_by_id.get(int(report_id))
+        if report is None:
+            return None
+        return dict(report,
+                    comments="Iron is higher than the limit value. Increased number of particles in oil sample.",
+                    upload={'upload_id': report['id'], 'filePath': f"/scans/files-{report['id']}.pdf"},
+                    site={'site_id': self.site_id, 'name': f"Site {self.site_id}", 'latidute': None, 'longitude': None})
+
+    def asset_reports(self, asset_name, latest_only):
+        rows = [dict(report, site={'site_id': self.site_id}) for report in self.reports if report['asset']['name'] == asset_name]
+        if not latest_only:
+            return rows
+        latest = {}
+        for row in rows:
+            key = row['systems']['system_id']
+            if key not in latest or (row['date'], row['id']) > (latest[key]['date'], latest[key]['id']):
+                latest[key] = row
+        return [latest[key] for key in sorted(latest)]
+
+    def asset_cards(self):
+        cards = {}
+        for report in self.reports:
+            card = cards.setdefault(report['asset']['id'], {'asset_id': report['asset']['id'], 'name': report['asset']['name'],
+                                                            'severity2': 0, 'severity1': 0, 'severity0': 0})
+            card[f"severity{report['severity']['severity']}"] += 1
+        return sorted(cards.values(), key=lambda card: (-card['severity2'], -card['severity1'], card['asset_id']))
+
+    def system_graph(self):
+        counts = Counter(report['systems']['name'] for report in self.reports if report['severity']['severity'] == 2)
+        return [{'systems': system['name'], 'severity2': counts.get(system['name'], 0)} for system in self.systems]
+
+
+class StubBackend:
+    """Threaded HTTP server for a set of synthetic sites."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0, **site_kwargs):
+        self.latency = latency_ms / 1000.0
+        self.site_kwargs = site_kwargs
+        self.sites = {}
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/v1/"
+
+    def site(self, site_id):
+        with self._lock:
+            if site_id not in self.sites:
+                self.sites[site_id] = SyntheticSite(site_id, **self.site_kwargs)
+            return self.sites[site_id]
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+    def route(self, path):
+        """Return (route name, payload) for a backend path, or (None, None) when it is unknown."""
+        path = path.split("?", 1)[0]
+        m = re.match(r"^/api/v1/sitepage/(summary|reports)/(\d+)$", path)
+        if m:
+            site = self.site(m.group(2))
+            if m.group(1) == "summary":
+                return "number_of_assets", {str(site.site_id): len(site.assets)}
+            return "number_of_reports", len(site.reports)
+
+        m = re.match(r"^/api/v1/sites/(\d+)/(.*)$", path)
+        if not m:
+            return None, None
+        site, rest = self.site(m.group(1)), m.group(2)
+
+        if rest == "assets":
+            return "assets", site.assets
+        if rest == "systems":
+            return "systems", site.systems
+        if rest == "reports":
+            return "reports", site.reports
+        if rest == "homepage-cards":
+            return "homepage_cards", site.asset_cards()
+        if rest == "homepage-graph":
+            return "homepage_graph", site.system_graph()
+        if rest == "comments":
+            return "comments", site.comments
+        m = re.match(r"^reports/data/(\d+)$", rest)
+        if m:
+            return "report_data", site.report_detail(m.group(1))
+        m = re.match(r"^reports/assetlist/(\d+)$", rest)
+        if m:
+            system_id = int(m.group(1))
+            assets = {r['asset']['id']: r['asset']['name'] for r in site.reports if r['systems']['system_id'] == system_id}
+            return "asset_list", [{'name': name, 'asset_id': asset_id} for asset_id, name in sorted(assets.items())]
+        m = re.match(r"^reports/asset/name/(full/)?([^/]+)$", rest)
+        if m:
+            return "asset_reports", site.asset_reports(m.group(2), latest_only=not m.group(1))
+        m = re.match(r"^(asset|report)/(\d+)/comments$", rest)
+        if m:
+            return f"{m.group(1)}_comments", [c for c in site.comments if c['entityType'] == m.group(1) and c['entityId'] == int(m.group(2))]
+        return None, None
+
+    def _handler(self):
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                name, payload = backend.route(self.path)
+                with backend._lock:
+                    backend.calls[name or "unknown"] += 1
+                if backend.latency:
+                    time.sleep(backend.latency)
+                status = 200 if name is not None and payload is not None else 404
+                # Collections honour the afterId watermark, as an incremental-sync capable backend would
+                after_id = parse_qs(urlsplit(self.path).query).get("afterId")
+                if status == 200 and after_id and name in ("reports", "comments"):
+                    payload = [row for row in payload if row['id'] > int(after_id[0])]
+                body = json.dumps(payload if status == 200 else {"error": "Not found"}).encode("utf-8")
+                etag = f'"{zlib.crc32(body):08x}"'
+                if status == 200 and self.headers.get("If-None-Match") == etag:
+                    status, body = 304, b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="stub-backend", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve synthetic site data on the backend API routes.")
+    parser.add_argument("--port", type=int, default=3050)
+    parser.add_argument("--assets", type=int, default=60)
+    parser.add_argument("--systems", type=int, default=8)
+    parser.add_argument("--reports", type=int, default=1500)
+    parser.add_argument("--comments", type=int, default=300)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    backend = StubBackend(port=args.port, latency_ms=args.latency_ms, n_assets=args.assets, n_systems=args.systems,
+                          n_reports=args.reports, n_comments=args.comments)
+    print(f"Stub backend on {backend.base_url}")
+    backend.server.serve_forever()
@@ -0,0 +1,138 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+from src.util.metrics import register, Counter
+
+ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', 60 * 60))
+ANSWER_CACHE_MAXSIZE = int(os.getenv('ANSWER_CACHE_MAXSIZE', 500))
+# Minimum n-gram similarity for a near match. Off (0) by default, so only exact matches are served
+ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', 0))
+
+# Words that flip or rank a question's meaning while barely changing its n-grams
+MEANING_WORDS = frozenset([
+    "no", "not", "none", "never", "without", "nor", "don", "doesn", "didn", "isn", "aren", "wasn", "weren", "hasn",
+    "haven", "won", "cannot", "except", "excluding", "least", "most", "best", "worst", "fewest", "lowest", "highest",
+    "more", "less", "fewer", "better", "worse", "first", "last", "latest", "oldest", "newest", "before", "after",
+])
+
+ANSWER_CACHE_REQUESTS = register(Counter("gpt_answer_cache_requests_total", "Answer cache lookups by result.", ("result",)))
+
+
+def normalise_query(query):
+    """Lower-case, drop punctuation and collapse whitespace so trivially different phrasings share a key."""
+    query = re.sub(r"[^\w\s]", " ", (query or "").lower())
+    return " ".join(query.split())
+
+
+def identifiers(normalised):
+    # Tokens with digits (asset names like f3, report IDs, dates) and negation or comparison words must match
+    # exactly, however similar the rest is
+    return frozenset(
+        token for token in normalised.split() if token in MEANING_WORDS or any(char.isdigit() for char in token)
+    )
+
+
+def ngrams(normalised, n=3):
+    padded = f" {normalised} "
+    return frozenset(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+
+
+def similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class AnswerCache:
+    """
+    Final answers keyed by site, normalised query text and a data-version stamp.
+
+    The version stamp is the site's report count, so a new report makes every earlier answer for the site unreachable.
+    Lookups try an exact match first, then the most similar cached question above the similarity threshold.
+    """
+
+    def __init__(self, ttl=ANSWER_CACHE_TTL, maxsize=ANSWER_CACHE_MAXSIZE, threshold=ANSWER_CACHE_SIMILARITY):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self._entries = OrderedDict()  # (site_id, version, normalised) -> (expires_at, answer, ngrams, identifiers)
+        self._lock = threading.Lock()
+
+    def lookup(self, site_id, version, query):
+        """
+        Returns:
+            tuple: (answer, match) where match is "exact" or "similar", or (None, None) on a miss.
+        """
+        normalised = normalise_query(query)
+        key = (str(site_id), version, normalised)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                ANSWER_CACHE_REQUESTS.inc(result="exact")
+                return entry[1], "exact"
+
+            if self.threshold > 0:
+                grams, ids = ngrams(normalised), identifiers(normalised)
+                best, best_score = None, self.threshold
+                for (entry_site, entry_version, _), (expires_at, answer, entry_grams, entry_ids) in self._entries.items():
+                    if entry_site != key[0] or entry_version != version or expires_at <= now or entry_ids != ids:
+                        continue
+                    score = similarity(grams, entry_grams)
+                    if score >= best_score:
+                        best, best_score = answer, score
+                if best is not None:
+                    ANSWER_CACHE_REQUESTS.inc(result="similar")
+                    return best, "similar"
+
+        ANSWER_CACHE_REQUESTS.inc(result="miss")
+        return None, None
+
+    def store(self, site_id, version, query, answer):
+        normalised = normalise_query(query)
+        site_id = str(site_id)
+        with self._lock:
+            # Answers for older versions of the site's data can never be served again
+            for key in [key for key in self._entries if key[0] == site_id and key[1] != version]:
+                del self._entries[key]
+            self._entries[(site_id, version, normalised)] = (
+                time.monotonic() + self.ttl, answer, ngrams(normalised), identifiers(normalised)
+            )
+            self._entries.move_to_end((site_id, version, normalised))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_site(self, site_id=None):
+        with self._lock:
+            for key in [key for key in self._entries if site_id is None or key[0] == str(site_id)]:
+                del self._entries[key]
+
+
+answer_cache = AnswerCache()
+
+
+def _version_stamp(version):
+    return version if isinstance(version, (int, float, str)) else repr(version)
+
+
+def data_version(api):
+    """The site's data-version stamp: its report count, or None if it cannot be read (which bypasses the cache)."""
+    try:
+        version = api.get_number_of_reports()
+    except Exception:
+        return None
+    return _version_stamp(version)
+
+
+async def data_version_async(api):
+    """data_version for an AsyncApplicationAPI."""
+    try:
+        version = await api.get_number_of_reports()
+    except Exception:
+        return None
+    return _version_stamp(version)
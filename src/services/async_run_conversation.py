@@ -0,0 +1,108 @@
+import json
+import asyncio
+import inspect
+
+from src.services.handle_functions import handle_function_call, error_result, timeout_result
+from src.services.routing import route_query, is_error_result
+from src.services.context import compact_messages, CONTEXT_TOKEN_BUDGET
+from src.services.result_shaping import encode_tool_result
+from src.services.model_client import get_async_model_client, model_timeout
+from src.util.metrics import span, record_usage, trace_incr, QUERY_DEPTH
+from src.services.run_converstaion import TOOL_MAX_WORKERS, TOOL_CALL_TIMEOUT
+
+
+async def run_tool_call_async(api, tool_call, semaphore, timeout=TOOL_CALL_TIMEOUT):
+    """Runs one tool call against an AsyncApplicationAPI, bounded by the shared semaphore and a timeout."""
+    function_name = tool_call.function.name
+    try:
+        function_args = json.loads(tool_call.function.arguments) if tool_call.function.arguments else {}
+    except ValueError:
+        return function_name, "Invalid JSON arguments."
+
+    async with semaphore:
+        # The dispatcher calls the API method, which for the async API hands back a coroutine to await here
+        function_response, _ = handle_function_call(api, function_name, function_args)
+        if inspect.isawaitable(function_response):
+            with span("tool", function_name) as record:
+                try:
+                    function_response = await asyncio.wait_for(function_response, timeout)
+                except asyncio.TimeoutError:
+                    record["error"] = "timeout"
+                    function_response = timeout_result(function_name, timeout)
+                except Exception as e:
+                    record["error"] = str(e)
+                    function_response = error_result(e)
+    return function_name, function_response
+
+
+async def run_conversation_async(api, user_query, introduction, max_depth, GPT_API_KEY, session_messages=None,
+                                 tool_timeout=TOOL_CALL_TIMEOUT, token_budget=CONTEXT_TOKEN_BUDGET, context_stats=None, result_stats=None,
+                                 max_concurrency=TOOL_MAX_WORKERS, route=None, outcome=None):
+    """
+    Async counterpart of run_conversation, for use with AsyncApplicationAPI from the ASGI app.
+
+    Model calls go through AsyncOpenAI and the tool calls of a turn run concurrently on the event loop,
+    so a waiting conversation holds no thread. outcome is filled as by run_conversation.
+    """
+    client = get_async_model_client(GPT_API_KEY)
+    if outcome is None:
+        outcome = {}
+    outcome.update(tool_errors=0, budget_stopped=False)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    if session_messages is None:
+        session_messages = []
+
+    if not session_messages:
+        session_messages.append({"role": "system", "content": introduction})
+
+    session_messages.append({"role": "user", "content": user_query})
+
+    if route is None:
+        route = route_query(user_query)
+
+    depth = 0
+
+    while depth < max_depth:
+        route.before_turn(depth)
+        stats = compact_messages(session_messages, token_budget, reserved=route.schema_tokens)
+        stats["depth"] = depth
+        if context_stats is not None:
+            context_stats.append(stats)
+
+        with span("model", route.model, depth=depth) as record:
+            response = await client.chat.completions.create(
+                model=route.model,
+                messages=session_messages,
+                tools=route.tools,
+                tool_choice="auto",
+                timeout=model_timeout(),
+            )
+            record_usage(record, response)
+        route.after_turn(response)
+
+        finish_reason = response.choices[0].finish_reason
+
+        if finish_reason == "stop":
+            if not route.accept_answer(response.choices[0].message.content):
+                depth += 1
+                continue
+            QUERY_DEPTH.observe(depth)
+            trace_incr("depth", depth)
+            route.finish()
+            return response, session_messages
+        elif finish_reason == "tool_calls":
+            tool_calls = response.choices[0].message.tool_calls
+            results = await asyncio.gather(*(run_tool_call_async(api, tool_call, semaphore, tool_timeout) for tool_call in tool_calls))
+            for function_name, function_response in results:
+                session_messages.append({"role": "system", "name": function_name, "content": encode_tool_result(function_name, function_response, result_stats)})
+            outcome["tool_errors"] += sum(is_error_result(function_response) for _, function_response in results)
+            route.after_tools([function_response for _, function_response in results])
+            depth += 1
+        else:
+            break
+
+    QUERY_DEPTH.observe(depth)
+    trace_incr("depth", depth)
+    route.finish()
+    return None, session_messages
@@ -0,0 +1,174 @@
+"""
+Batch queries for offline report generation, such as nightly per-asset health summaries.
+
+All queries in a batch share one API instance, and so one read cache and site snapshot. The shared site data is
+fetched once before the first query starts, and the queries then run concurrently. Results are written as JSON
+lines as each query finishes, and a resumed batch skips the items its output already records as done.
+
+    python -m src.services.batch --site-id 1 --input queries.jsonl --output results.jsonl --concurrency 4
+
+Input lines are either a JSON string (the query) or an object with "query" and an optional "id".
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.services.run_converstaion import run_conversation
+from src.services.prompts import DEFAULT_INTRODUCTION
+from src.services.routing import route_query
+from src.util.api_factory import build_api
+from src.util.metrics import start_trace, end_trace, register, Counter
+from src.util.admission import start_budget, end_budget, REQUEST_TIME_BUDGET
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', 4))
+# Site-level reads that nearly every query starts from, fetched once per batch before the queries run
+BATCH_WARM_METHODS = ("get_all_reports_data", "get_asset_ids_names", "get_system_list_for_site", "get_all_asset_severity_data")
+
+BATCH_ITEMS = register(Counter("gpt_batch_items_total", "Batch items by outcome.", ("status",)))
+
+
+def item_id(query):
+    """Stable id for an item given without one, so resumed batches recognise it."""
+    return hashlib.sha1(query.encode("utf-8")).hexdigest()[:12]
+
+
+def normalise_items(items):
+    """Turn query strings and {"query", "id"} objects into {"id", "query"} dicts."""
+    normalised = []
+    for item in items:
+        if isinstance(item, str):
+            item = {"query": item}
+        query = item.get("query")
+        if not query:
+            raise ValueError(f"Batch item has no query: {item!r}")
+        normalised.append({"id": str(item.get("id") or item_id(query)), "query": query})
+    return normalised
+
+
+def completed_ids(output_path):
+    """Ids recorded as done in an existing JSONL output; failed items are left out so they are retried."""
+    done = set()
+    if not output_path or not os.path.exists(output_path):
+        return done
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by an interrupted run
+            if record.get("status") == "ok":
+                done.add(str(record.get("id")))
+    return done
+
+
+def warm_api(api, methods=BATCH_WARM_METHODS):
+    """Fetch the shared site data once so concurrent queries find it in the cache instead of all fetching it."""
+    for method_name in methods:
+        try:
+            getattr(api, method_name)()
+        except Exception as e:
+            logger.warning("Batch warm-up of %s failed: %s", method_name, e)
+
+
+def run_item(api, item, max_depth, GPT_API_KEY, introduction=DEFAULT_INTRODUCTION, time_budget=REQUEST_TIME_BUDGET):
+    """Answer one batch item in its own trace and time budget. Returns its result record; errors are recorded, not raised."""
+    trace, trace_token = start_trace()
+    budget_token = start_budget(time_budget)
+    started = time.perf_counter()
+    record = {"id": item["id"], "query": item["query"]}
+    try:
+        route = route_query(item["query"])
+        response, _ = run_conversation(api, item["query"], introduction, max_depth, GPT_API_KEY, [], route=route)
+        record["response"] = response.choices[0].message.content if response else None
+        record["status"] = "ok" if record["response"] else "no_response"
+        record["route"] = route.summary()
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+    finally:
+        end_budget(budget_token)
+        end_trace(trace_token)
+    record["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    record["backend_calls"] = trace.counters.get("backend_calls", 0)
+    BATCH_ITEMS.inc(status=record["status"])
+    return record
+
+
+def iter_batch(api, items, max_depth, GPT_API_KEY, max_concurrency=BATCH_MAX_CONCURRENCY, skip_ids=(), **kwargs):
+    """
+    Run batch items concurrently against one shared API and yield each result record as it finishes.
+
+    Items whose id is in skip_ids are not run. Records have id, query, status ("ok", "no_response" or "error"),
+    response or error, route, duration_ms and backend_calls.
+    """
+    skip_ids = set(skip_ids)
+    pending = [item for item in normalise_items(items) if item["id"] not in skip_ids]
+    if not pending:
+        return
+    warm_api(api)
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="batch") as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, run_item, api, item, max_depth, GPT_API_KEY, **kwargs)
+            for item in pending
+        ]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        except GeneratorExit:
+            # The consumer went away (e.g. a client disconnected), so drop the items that have not started yet
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+
+def run_batch(site_id, items, output_path, max_depth, GPT_API_KEY, max_concurrency=BATCH_MAX_CONCURRENCY, resume=True, **kwargs):
+    """
+    Run a batch for one site and append each result to output_path as a JSON line as soon as it finishes.
+
+    Returns:
+        dict: Counts of items skipped as already done and of each result status.
+    """
+    skip_ids = completed_ids(output_path) if resume else set()
+    summary = {"skipped": len({item["id"] for item in normalise_items(items)} & skip_ids)}
+    with open(output_path, "a" if resume else "w") as f:
+        for record in iter_batch(build_api(site_id), items, max_depth, GPT_API_KEY, max_concurrency, skip_ids, **kwargs):
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            summary[record["status"]] = summary.get(record["status"], 0) + 1
+    return summary
+
+
+def read_items(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a file of queries for one site and write the results as JSON lines.")
+    parser.add_argument("--site-id", required=True)
+    parser.add_argument("--input", required=True, help="JSONL file of queries: strings or {\"id\", \"query\"} objects")
+    parser.add_argument("--output", required=True, help="JSONL results file; existing ok results are skipped")
+    parser.add_argument("--concurrency", type=int, default=BATCH_MAX_CONCURRENCY)
+    parser.add_argument("--max-depth", type=int, default=5)
+    parser.add_argument("--time-budget", type=float, default=REQUEST_TIME_BUDGET, help="Seconds per query, 0 for no limit")
+    parser.add_argument("--no-resume", action="store_true", help="Overwrite the output instead of skipping done items")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    summary = run_batch(args.site_id, read_items(args.input), args.output, args.max_depth, os.getenv('OPENAI_API_KEY'),
+                        args.concurrency, resume=not args.no_resume, time_budget=args.time_budget)
+    print(json.dumps(summary))
+    return 1 if summary.get("error") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import os
+import json
+
+# Optional exact tokenizer; falls back to a character estimate when tiktoken is not installed
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 24000))
+CONTEXT_KEEP_RECENT = int(os.getenv('CONTEXT_KEEP_RECENT', 6))
+
+# Overhead the chat format adds around every message
+TOKENS_PER_MESSAGE = 4
+COMPACTED_PREFIX = "[Compacted]"
+
+
+def count_text_tokens(text):
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def count_tokens(messages):
+    """Estimate the prompt tokens a list of chat messages will cost."""
+    total = 0
+    for message in messages:
+        total += TOKENS_PER_MESSAGE
+        total += count_text_tokens(message.get("content") or "")
+        total += count_text_tokens(message.get("name") or "")
+    return total
+
+
+def is_tool_result(message):
+    # Tool results are appended as system messages carrying the tool name
+    return message.get("role") == "tool" or (message.get("role") == "system" and "name" in message)
+
+
+def summarise_tool_result(message):
+    """Replace a tool result with a short reference the model can act on."""
+    name = message.get("name", "tool")
+    content = message.get("content") or ""
+    try:
+        data = json.loads(content)
+    except ValueError:
+        data = None
+    if isinstance(data, list):
+        shape = f"{len(data)} rows"
+    elif isinstance(data, dict) and "total_rows" in data:
+        shape = f"{data['total_rows']} rows"
+    elif isinstance(data, dict):
+        shape = f"object with keys {', '.join(list(data)[:8])}"
+    else:
+        shape = f"{len(content)} characters"
+    return f"{COMPACTED_PREFIX} Earlier result of {name} ({shape}) removed to save context. Call {name} again if it is needed."
+
+
+def truncate_tool_result(message, max_tokens):
+    """
+    Cut a tool result's rows so its content fits in about max_tokens, keeping it valid and self-describing.
+
+    Tables from result shaping keep their columns and gain more_available. A plain list becomes
+    {"items", "total_rows", "more_available"}. Returns the new content, or None for results with no rows to cut.
+    """
+    content = message.get("content") or ""
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return None
+    if isinstance(data, dict) and isinstance(data.get("rows"), list):
+        rows, total = data["rows"], data.get("total_rows", len(data["rows"]))
+        build = lambda keep: dict(data, rows=rows[:keep], more_available=total - keep)
+    elif isinstance(data, list):
+        rows, total = data, len(data)
+        build = lambda keep: {"items": rows[:keep], "total_rows": total, "more_available": total - keep}
+    else:
+        return None
+
+    # Start from the proportional share of rows and shrink until it fits
+    keep = min(len(rows), len(rows) * max_tokens // max(1, count_text_tokens(content)))
+    while True:
+        truncated = json.dumps(build(keep), separators=(",", ":"))
+        if keep == 0 or count_text_tokens(truncated) <= max_tokens:
+            return truncated
+        keep = keep * 3 // 4
+
+
+def compact_messages(messages, budget=CONTEXT_TOKEN_BUDGET, keep_recent=CONTEXT_KEEP_RECENT, reserved=0):
+    """
+    Compacts the conversation in place so it fits within a token budget.
+
+    The system prompt and the last keep_recent messages are kept verbatim where possible. Older tool results are
+    replaced with short summaries, oldest first, until the conversation fits. If it still does not fit, as when one
+    turn fans out into many large results, the recent tool results are cut down too, largest first: their rows are
+    truncated, or results with no rows are summarised.
+
+    Args:
+        messages (list): The session messages, modified in place.
+        budget (int): Target prompt tokens.
+        keep_recent (int): Number of trailing messages kept verbatim while older results can be compacted.
+        reserved (int): Tokens sent with every call outside the messages, such as the tool schemas.
+
+    Returns:
+        dict: Token counts before and after compaction (tool schemas included) and the number of results
+              compacted and truncated.
+    """
+    before = count_tokens(messages) + reserved
+    tokens = before
+    compacted = 0
+    truncated = 0
+
+    cutoff = max(1, len(messages) - keep_recent)
+    for index in range(1, cutoff):
+        if tokens <= budget:
+            break
+        message = messages[index]
+        if not is_tool_result(message) or (message.get("content") or "").startswith(COMPACTED_PREFIX):
+            continue
+        old_tokens = count_text_tokens(message.get("content") or "")
+        summary = summarise_tool_result(message)
+        messages[index] = dict(message, content=summary)
+        tokens -= old_tokens - count_text_tokens(summary)
+        compacted += 1
+
+    # Last resort: cut the protected results, largest first, each by the amount still over budget
+    protected = [
+        index for index in range(cutoff, len(messages))
+        if is_tool_result(messages[index]) and not (messages[index].get("content") or "").startswith(COMPACTED_PREFIX)
+    ]
+    protected.sort(key=lambda index: count_text_tokens(messages[index].get("content") or ""), reverse=True)
+    for index in protected:
+        if tokens <= budget:
+            break
+        message = messages[index]
+        old_tokens = count_text_tokens(message.get("content") or "")
+        content = truncate_tool_result(message, max(0, old_tokens - (tokens - budget)))
+        if content is None:
+            content = summarise_tool_result(message)
+        new_tokens = count_text_tokens(content)
+        if new_tokens >= old_tokens:
+            continue
+        messages[index] = dict(message, content=content)
+        tokens -= old_tokens - new_tokens
+        truncated += 1
+
+    return {"tokens_before": before, "tokens_after": tokens, "schema_tokens": reserved, "compacted": compacted,
+            "truncated": truncated}
@@ -1,84 +1,64 @@
-def handle_function_call(api, function_name, function_args):
-    """
-    Handles API function calls based on the function name and arguments.
-    Updates the context with the data collected and determines the next steps.
-    
-    Args:
-        function_name (str): The name of the function to call.
-        function_args (dict): Arguments needed for the API function.
-        context (dict): Context of the conversation to be updated.
-    
-    Returns:
-        tuple: The response from the function and the updated context.
-    """
-    function_response = None
-    break_loop = False
+import inspect
+
+from src.services.tools import TOOL_REGISTRY
+from src.util.metrics import span
+from src.util.admission import Overloaded
 
-    try:
-        if function_name == "get_asset_ids_names":
-            asset_data = api.get_asset_ids_names()
-            function_response = asset_data        
+# Tool results for a busy or slow upstream, rather than a problem with the call itself, start with this
+UNAVAILABLE_PREFIX = "An error occurred (upstream unavailable): "
+# The HTTP clients' timeout and connection errors, matched by class name so neither client is imported here
+_UNAVAILABLE_ERROR_NAMES = {"Timeout", "TimeoutException", "ConnectionError", "ConnectError"}
 
-        elif function_name == "get_single_report_data":
-            if 'reportID' in function_args:
-                report_data = api.get_single_report_data(function_args['reportID'])
-                function_response = report_data
-          
-            else:
-                function_response = "Report ID missing."
-                
-        elif function_name == "get_all_report_data_from_asset_names":
-            if 'assetName' in function_args:
-                reports_data = api.get_all_report_data_from_asset_names(function_args['assetName'])
-                function_response = reports_data
 
-        elif function_name == "get_all_report_data_from_asset_names_full":
-            if 'assetName' in function_args:
-                reports_data = api.get_all_report_data_from_asset_names_full(function_args['assetName'])
-                function_response = reports_data
-            
-        elif function_name == "get_all_system_severity_data":
-            severity_data = api.get_all_system_severity_data()
-            function_response = severity_data
-        
+def is_unavailable_error(exc):
+    """True for admission rejections, timeouts, connection failures and 429/502/503/504 responses."""
+    if isinstance(exc, (Overloaded, TimeoutError, ConnectionError)):
+        return True
+    response = getattr(exc, "response", None)
+    if getattr(response, "status_code", None) in (429, 502, 503, 504):
+        return True
+    return any(cls.__name__ in _UNAVAILABLE_ERROR_NAMES for cls in type(exc).__mro__)
 
-        elif function_name == "get_number_of_assets":
-            num_assets = api.get_number_of_assets()
-            function_response = num_assets
 
-        elif function_name == "get_asset_ids_names":
-            asset_ids_names = api.get_asset_ids_names()
-            function_response = asset_ids_names
-        
+def error_result(exc):
+    """The tool result reporting a call that raised exc."""
+    if is_unavailable_error(exc):
+        return f"{UNAVAILABLE_PREFIX}{str(exc)}"
+    return f"An error occurred: {str(exc)}"
 
-        elif function_name == "get_number_of_reports":
-            num_reports = api.get_number_of_reports()
-            function_response = num_reports
-        
 
-        elif function_name == "get_all_asset_severity_data":
-            severity_data = api.get_all_asset_severity_data()
-            function_response = severity_data
+def timeout_result(function_name, timeout):
+    """The tool result reporting a call that did not finish within timeout seconds."""
+    return f"{UNAVAILABLE_PREFIX}{function_name} timed out after {timeout:g} seconds."
 
-        elif function_name == "get_asset_comments":
-            if 'assetID' in function_args:
-                function_response = api.get_asset_comments(function_args['entityId'])
-            else:
-                function_response = "Entity ID missing for asset comments."
 
-        elif function_name == "get_report_comments":
-            if 'reportID' in function_args:
-                function_response = api.get_report_comments(function_args['entityId'])
-            else:
-                function_response = "Entity ID missing for report comments."
+def handle_function_call(api, function_name, function_args):
+    """
+    Handles API function calls based on the function name and arguments.
+    Looks the tool up in TOOL_REGISTRY and calls the ApplicationAPI method it declares.
 
-        elif function_name == "get_all_report_comments":
-            function_response = api.get_all_report_comments()
+    Args:
+        api (ApplicationAPI): The API the tool is called against.
+        function_name (str): The name of the function to call.
+        function_args (dict): Arguments needed for the API function.
+
+    Returns:
+        tuple: The response from the function and whether the tool loop should stop.
+    """
+    function_response = None
+    break_loop = False
 
-        else:
-            function_response = "Function not recognized."
+    tool = TOOL_REGISTRY.get(function_name)
+    if tool is None:
+        return "Function not recognized.", break_loop
 
-    except Exception as e:
-        function_response = f"An error occurred: {str(e)}"
+    with span("tool", function_name) as record:
+        try:
+            function_response = tool.call(api, function_args)
+            # Async APIs hand back a coroutine; the caller awaits and times it
+            record["discard"] = inspect.isawaitable(function_response)
+        except Exception as e:
+            record["error"] = str(e)
+            function_response = error_result(e)
 
     return function_response, break_loop
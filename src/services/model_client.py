@@ -0,0 +1,68 @@
+import os
+import threading
+
+from openai import OpenAI, AsyncOpenAI, APIConnectionError
+
+from src.util.admission import clamp_to_budget, model_limiter
+
+# Longest one model call may take, cut further to what is left of the request's time budget. The floor keeps enough
+# time for the final answer that is asked for once the budget is nearly spent.
+MODEL_CALL_TIMEOUT = float(os.getenv('MODEL_CALL_TIMEOUT', 60))
+MODEL_MIN_TIMEOUT = float(os.getenv('MODEL_MIN_TIMEOUT', 5))
+
+# Connection resets and timeouts (APITimeoutError is a subclass) are retried by admission control, like 429 and 5xx
+model_limiter.retry_errors = (APIConnectionError,)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _get_or_create(key, factory):
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = factory()
+    return client
+
+
+def model_timeout():
+    """Timeout in seconds for the next model call, so a stalled call cannot outlive the request's budget."""
+    return max(MODEL_MIN_TIMEOUT, clamp_to_budget(MODEL_CALL_TIMEOUT))
+
+
+def get_model_client(api_key):
+    """
+    Return the process-wide OpenAI client for an API key.
+
+    The client and its connection pool are created once and shared by every request thread, so queries reuse
+    open connections to the model endpoint instead of paying for a new pool and TLS handshake each time.
+    Retries are left to admission control (model_limiter), which retries connection errors, timeouts, 429 and 5xx
+    responses, honouring Retry-After and the request's time budget.
+    """
+    return _get_or_create(("sync", api_key), lambda: OpenAI(api_key=api_key, max_retries=0))
+
+
+def get_async_model_client(api_key):
+    """
+    Return the process-wide AsyncOpenAI client for an API key, for use from the ASGI server's event loop.
+
+    The async path has no admission control, so the client retries the same failures itself, as many times.
+    """
+    return _get_or_create(("async", api_key), lambda: AsyncOpenAI(api_key=api_key, max_retries=model_limiter.retries))
+
+
+def close_model_clients():
+    """Close every shared sync client, e.g. on shutdown or after forking worker processes."""
+    with _clients_lock:
+        for key in [key for key in _clients if key[0] == "sync"]:
+            _clients.pop(key).close()
+
+
+async def close_async_model_clients():
+    """Close every shared async client, e.g. on ASGI lifespan shutdown."""
+    with _clients_lock:
+        clients = [_clients.pop(key) for key in [key for key in _clients if key[0] == "async"]]
+    for client in clients:
+        await client.close()
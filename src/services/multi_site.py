@@ -0,0 +1,98 @@
+import os
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from src.util.api_factory import build_api
+from src.util.database_API_connection import ApplicationAPI
+
+MULTI_SITE_MAX_WORKERS = int(os.getenv('MULTI_SITE_MAX_WORKERS', 8))
+
+# Kept apart from the tool-call pool: fan-outs run inside tool calls, and sharing one pool could deadlock it
+_site_executor = ThreadPoolExecutor(max_workers=MULTI_SITE_MAX_WORKERS, thread_name_prefix="site-fan-out")
+
+MULTI_SITE_INTRODUCTION = """
+You are analysing several sites at once: {site_ids}. Every tool runs against all of these sites and its results are
+merged into one response in which each row carries a site_id field. Compare sites using that field, and when
+referring to a report or asset, always say which site it belongs to.
+"""
+
+
+def merge_site_results(results):
+    """
+    Merge per-site results into one response.
+
+    Lists of records are interleaved site by site (each site's first row, then each site's second row, ...) with
+    a site_id added to each row. A tool's row cap applied to the merged list then keeps every site's leading rows
+    instead of only the first site's. Anything else becomes one {"site_id", "result"} row per site. Sites that
+    failed contribute a {"site_id", "error"} row, placed first.
+    """
+    merged = []
+    tabular = all(isinstance(result, list) and all(isinstance(row, dict) for row in result)
+                  for result, error in results.values() if error is None)
+    site_rows = []
+    for site_id, (result, error) in results.items():
+        if error is not None:
+            merged.append({"site_id": site_id, "error": error})
+        elif tabular:
+            site_rows.append([dict(row, site_id=site_id) for row in result])
+        else:
+            site_rows.append([{"site_id": site_id, "result": result}])
+    for depth in range(max((len(rows) for rows in site_rows), default=0)):
+        merged.extend(rows[depth] for rows in site_rows if depth < len(rows))
+    return merged
+
+
+class MultiSiteAPI:
+    """
+    Scatter-gather facade over one ApplicationAPI per site.
+
+    Exposes the same methods as ApplicationAPI, so the tool registry dispatches to it unchanged. Each call runs
+    on every site concurrently, with at most MULTI_SITE_MAX_WORKERS sites in flight, and the results are merged.
+    """
+
+    def __init__(self, site_ids, build=build_api):
+        self.site_ids = list(site_ids)
+        self.apis = {site_id: build(site_id) for site_id in self.site_ids}
+
+    def fan_out(self, method_name, *args):
+        futures = {
+            site_id: _site_executor.submit(contextvars.copy_context().run, getattr(api, method_name), *args)
+            for site_id, api in self.apis.items()
+        }
+        results = {}
+        for site_id, future in futures.items():
+            try:
+                results[site_id] = (future.result(), None)
+            except Exception as e:
+                results[site_id] = (None, f"An error occurred: {str(e)}")
+        return merge_site_results(results)
+
+    def __getattr__(self, name):
+        # Only ApplicationAPI's public read methods are fanned out
+        if name.startswith("_") or not callable(getattr(ApplicationAPI, name, None)):
+            raise AttributeError(name)
+        return lambda *args: self.fan_out(name, *args)
+
+
+class AsyncMultiSiteAPI:
+    """Async counterpart of MultiSiteAPI for the ASGI path: each call is awaited on every site concurrently."""
+
+    def __init__(self, site_ids, build):
+        self.site_ids = list(site_ids)
+        self.apis = {site_id: build(site_id) for site_id in self.site_ids}
+
+    async def fan_out(self, method_name, *args):
+        outcomes = await asyncio.gather(*(getattr(api, method_name)(*args) for api in self.apis.values()), return_exceptions=True)
+        results = {}
+        for site_id, outcome in zip(self.apis, outcomes):
+            if isinstance(outcome, BaseException):
+                results[site_id] = (None, f"An error occurred: {str(outcome)}")
+            else:
+                results[site_id] = (outcome, None)
+        return merge_site_results(results)
+
+    def __getattr__(self, name):
+        if name.startswith("_") or not callable(getattr(ApplicationAPI, name, None)):
+            raise AttributeError(name)
+        return lambda *args: self.fan_out(name, *args)
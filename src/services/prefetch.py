@@ -0,0 +1,100 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.util.metrics import register, Counter
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', '1') not in ('0', 'false', 'False')
+# Most follow-up lookups warmed per tool result, and most prefetches in flight across the process
+PREFETCH_BUDGET = int(os.getenv('PREFETCH_BUDGET', 5))
+PREFETCH_MAX_INFLIGHT = int(os.getenv('PREFETCH_MAX_INFLIGHT', 16))
+
+PREFETCH_REQUESTS = register(Counter("gpt_prefetch_total", "Speculative follow-up lookups by outcome.", ("result",)))
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+_inflight = threading.BoundedSemaphore(PREFETCH_MAX_INFLIGHT)
+
+
+def _severity(row):
+    severity = row.get('severity')
+    if isinstance(severity, dict):
+        return severity.get('severity') or 0, severity.get('severity_count') or 0
+    return severity or 0, 0
+
+
+def top_report_ids(rows, budget):
+    """IDs of the most severe, most recent reports in a list of report rows."""
+    reports = [row for row in rows if isinstance(row, dict) and 'id' in row]
+    reports.sort(key=lambda row: (_severity(row), row.get('date') or ''), reverse=True)
+    return [row['id'] for row in reports[:budget] if _severity(row)[0] > 0]
+
+
+def top_asset_names(data, budget):
+    """Asset names in the order they appear in the severity-sorted homepage cards."""
+    rows = data if isinstance(data, list) else [value for value in (data or {}).values() if isinstance(value, list)][:1]
+    if rows and isinstance(rows[0], list):
+        rows = rows[0]
+    names = []
+    for row in rows or []:
+        if not isinstance(row, dict):
+            continue
+        name = row.get('name') or row.get('assetName') or (row.get('asset') or {}).get('name')
+        if name and name not in names:
+            names.append(name)
+        if len(names) >= budget:
+            break
+    return names
+
+
+def predict_followups(function_name, function_response, budget=PREFETCH_BUDGET):
+    """
+    Predict the lookups the model is likely to ask for next, from the tool it just called and what it returned.
+
+    Returns:
+        list: (method name, args) pairs, at most budget long.
+    """
+    if function_name in ("get_all_report_data_from_asset_names", "get_all_report_data_from_asset_names_full", "get_reports_by_severity"):
+        if isinstance(function_response, list):
+            return [("get_single_report_data", (report_id,)) for report_id in top_report_ids(function_response, budget)]
+    if function_name == "get_all_asset_severity_data":
+        return [("get_all_report_data_from_asset_names", (name,)) for name in top_asset_names(function_response, budget)]
+    return []
+
+
+def _warm(api, method_name, args):
+    try:
+        getattr(api, method_name)(*args)
+        PREFETCH_REQUESTS.inc(result="completed")
+    except Exception as e:
+        PREFETCH_REQUESTS.inc(result="failed")
+        logger.debug("Prefetch of %s%r failed: %s", method_name, args, e)
+    finally:
+        _inflight.release()
+
+
+def prefetch_followups(api, function_name, function_response, budget=PREFETCH_BUDGET):
+    """
+    Warm the likely next lookups in the background while the model reads the current result.
+
+    Only runs for APIs with a read cache, since otherwise the warmed data would be thrown away. Lookups that
+    would exceed the in-flight limit are skipped rather than queued, so prefetching never delays real calls.
+
+    Returns:
+        int: The number of lookups scheduled.
+    """
+    if not PREFETCH_ENABLED or getattr(api, "cache", None) is None:
+        return 0
+
+    scheduled = 0
+    for method_name, args in predict_followups(function_name, function_response, budget):
+        if not _inflight.acquire(blocking=False):
+            PREFETCH_REQUESTS.inc(result="skipped")
+            continue
+        # Runs outside the query's trace context so warmed lookups are not billed to the current query
+        _prefetch_executor.submit(_warm, api, method_name, args)
+        PREFETCH_REQUESTS.inc(result="scheduled")
+        scheduled += 1
+    return scheduled
@@ -0,0 +1,22 @@
+# Default introduction text
+DEFAULT_INTRODUCTION = """The system manages a database of reports and assets for various sites. Each site contains multiple assets, and each asset is linked to specific systems. 
+Reports generated for these systems contain critical data points, including severity levels that indicate the importance of the information (0=no warning, 1=early warning, 2=advanced warning).
+The API provides access to these reports, assets, and system details, enabling in-depth data analysis.
+
+As part of your response I would like you to suggest hyperlinks to different parts of the front end. Here is the EXACT LINKS:
+
+
+- **Asset Information**: Use the asset ID only. Format: `http://localhost:4200/sites/summary?view=asset&asset_id={assetId}`
+- **Report Information**: This requires only the report ID number. Format: `http://localhost:4200/sites/summary/{reportId}`
+- **Report Data Trend Analysis**: General link, no ID required. `http://localhost:4200/sites/analytics`
+- **Report Data Table Showing Most Recent Data**: General link, no ID required. `http://localhost:4200/sites/comparison`
+- **Summary of All Reports for User to View**: General link, no ID required. `http://localhost:4200/sites/summary?view=total`
+- **Homepage for Site**: General link, no ID required. `http://localhost:4200/sites/home`
+- **Page to pick a site for analysis**: General link, no ID required. `http://localhost:4200/sites`
+- **Page to see all comments**: General link, no ID required. `http://localhost:4200/sites/comments`
+- **Page to upload files into**: General link, no ID required. `http://localhost:4200/sites/upload`
+
+
+Please as much as possible use EXACT HYPERLINKS to guide to user to more information on the site.
+
+"""
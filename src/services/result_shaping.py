@@ -0,0 +1,137 @@
+import os
+import json
+import logging
+
+from src.services.tools import TOOL_REGISTRY
+from src.services.context import count_text_tokens
+from src.util.metrics import span, PAYLOAD_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Default cap on rows per list sent to the model; tools can override it with Tool(max_rows=...)
+RESULT_MAX_ROWS = int(os.getenv('RESULT_MAX_ROWS', 200))
+# Fields added by the multi-site merge, kept through any projection so every row still says which site it is from
+PASSTHROUGH_FIELDS = ("site_id", "error", "result")
+
+
+def _lookup(row, path):
+    # Follow a dotted path such as "severity.severity" through nested dicts
+    value = row
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _flatten(row, prefix=""):
+    flat = {}
+    for key, value in row.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def _unwrap(row):
+    # A merged {"site_id", "result"} row whose result is a single record is shaped as that record plus its site_id
+    result = row.get("result")
+    if set(row) == {"site_id", "result"} and isinstance(result, dict) and not any(isinstance(value, list) for value in result.values()):
+        return dict(result, site_id=row["site_id"])
+    return row
+
+
+def project_row(row, projection):
+    """
+    Keep only the projected fields of a row. projection maps output name -> dotted source path.
+
+    The multi-site fields in PASSTHROUGH_FIELDS are kept whenever the row has them.
+    """
+    row = _unwrap(row)
+    if not projection:
+        return _flatten(row)
+    projected = {"site_id": row["site_id"]} if "site_id" in row else {}
+    projected.update((name, _lookup(row, path)) for name, path in projection.items())
+    projected.update((field, row[field]) for field in PASSTHROUGH_FIELDS[1:] if field in row)
+    return projected
+
+
+def to_table(rows, projection=None, max_rows=RESULT_MAX_ROWS):
+    """
+    Encode a list of dicts as one header plus value rows, truncated to max_rows.
+
+    Returns:
+        dict: {"columns", "rows", "total_rows"} plus "more_available" when rows were cut.
+    """
+    projected = [project_row(row, projection) for row in rows]
+    columns = []
+    for row in projected:
+        for key in row:
+            if key not in columns:
+                columns.append(key)
+    table = {
+        "columns": columns,
+        "rows": [[row.get(column) for column in columns] for row in projected[:max_rows]],
+        "total_rows": len(projected),
+    }
+    if len(projected) > max_rows:
+        table["more_available"] = len(projected) - max_rows
+    return table
+
+
+def shape_result(function_name, function_response):
+    """
+    Reduce a tool response to what the model needs.
+
+    Lists of records become tables, objects keep only their projected fields, and anything else is returned unchanged.
+    """
+    tool = TOOL_REGISTRY.get(function_name)
+    projection = tool.projection if tool else None
+    max_rows = tool.max_rows if tool and tool.max_rows else RESULT_MAX_ROWS
+
+    if isinstance(function_response, list) and function_response and all(isinstance(row, dict) for row in function_response):
+        return to_table(function_response, projection, max_rows)
+    if isinstance(function_response, dict):
+        if projection and not any(isinstance(value, list) for value in function_response.values()):
+            return project_row(function_response, projection)
+        shaped = {}
+        for key, value in function_response.items():
+            if isinstance(value, list) and value and all(isinstance(row, dict) for row in value):
+                shaped[key] = to_table(value, projection, max_rows)
+            else:
+                shaped[key] = value
+        return shaped
+    return function_response
+
+
+def encode_tool_result(function_name, function_response, result_stats=None):
+    """
+    Shape and serialise a tool response for the conversation.
+
+    Args:
+        function_name (str): The tool that produced the response.
+        function_response: The raw response.
+        result_stats (list): If given, a dict of bytes and estimated tokens before and after shaping is appended.
+
+    Returns:
+        str: The JSON content for the tool message.
+    """
+    with span("serialize", function_name) as record:
+        raw = json.dumps(function_response)
+        content = json.dumps(shape_result(function_name, function_response), separators=(",", ":"))
+        if len(content) >= len(raw):
+            content = raw
+        record["bytes"] = len(content)
+    PAYLOAD_BYTES.observe(len(content), direction="tool_result")
+
+    stats = {
+        "name": function_name,
+        "bytes_before": len(raw),
+        "bytes_after": len(content),
+        "tokens_saved": count_text_tokens(raw) - count_text_tokens(content),
+    }
+    logger.info("Shaped %s result: %d -> %d bytes (~%d tokens saved)", function_name, stats["bytes_before"], stats["bytes_after"], stats["tokens_saved"])
+    if result_stats is not None:
+        result_stats.append(stats)
+    return content
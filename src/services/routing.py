@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import time
+import logging
+
+from src.services.tools import TOOL_REGISTRY, TOOLS
+from src.services.handle_functions import UNAVAILABLE_PREFIX
+from src.services.context import count_text_tokens
+from src.util.metrics import register, Counter, Histogram, trace_incr
+
+logger = logging.getLogger(__name__)
+
+ROUTING_ENABLED = os.getenv('ROUTING_ENABLED', '1') not in ('0', 'false', 'False')
+MODEL_TIERS = {
+    "small": os.getenv('ROUTING_SMALL_MODEL', 'gpt-3.5-turbo'),
+    "large": os.getenv('ROUTING_LARGE_MODEL', 'gpt-4-turbo'),
+}
+# Model turns a small-tier route gets before the query is handed to the large model with every tool
+ROUTING_ESCALATE_AFTER_DEPTH = int(os.getenv('ROUTING_ESCALATE_AFTER_DEPTH', 2))
+
+ROUTE_DECISIONS = register(Counter("gpt_route_decisions_total", "Queries by route and starting model tier.", ("route", "tier")))
+ROUTE_ESCALATIONS = register(Counter("gpt_route_escalations_total", "Escalations to the large model by route and reason.", ("route", "reason")))
+ROUTE_SCHEMA_TOKENS = register(Counter("gpt_route_schema_tokens_total", "Tool-schema tokens sent to the model by route.", ("route",)))
+ROUTE_MODEL_TOKENS = register(Counter("gpt_route_model_tokens_total", "Model tokens by route, model and type.", ("route", "model", "type")))
+ROUTE_SECONDS = register(Histogram("gpt_route_query_seconds", "Tool-loop time per query by route and final model.", ("route", "model")))
+
+# Tool responses that mean the call did not get the model what it needed
+ERROR_PREFIXES = ("An error occurred", "Function not recognized", "Argument ", "Invalid JSON")
+
+
+class QueryRoute:
+    """
+    A class of query: the keyword rules that recognise it, the tools it needs and the model tier that can answer it.
+
+    Args:
+        name (str): Route name used in metrics and responses.
+        patterns (list): Regular expressions matched against the lower-cased query.
+        tools (list): Names of the registered tools exposed to the model for this route.
+        tier (str): "small" or "large", a key of MODEL_TIERS.
+    """
+
+    def __init__(self, name, patterns, tools, tier="small"):
+        self.name = name
+        self.patterns = [re.compile(pattern) for pattern in patterns]
+        self.tools = tools
+        self.tier = tier
+
+    def matches(self, query):
+        return any(pattern.search(query) for pattern in self.patterns)
+
+
+ROUTES = [
+    QueryRoute(
+        "count",
+        [r"\bhow many\b", r"\bnumber of\b", r"\bcount", r"\btotal\b"],
+        ["get_number_of_assets", "get_number_of_reports", "get_report_counts", "get_system_list_for_site", "get_asset_ids_names"],
+    ),
+    QueryRoute(
+        "ranking",
+        [r"\bworst\b", r"\bmost (severe|critical|at risk)\b", r"\btop \d+\b", r"\bpriorit", r"\btrend", r"\bover time\b",
+         r"\bgetting (better|worse)\b"],
+        ["get_worst_assets", "get_severity_trend", "get_report_counts", "get_all_asset_severity_data", "get_all_system_severity_data"],
+    ),
+    QueryRoute(
+        "severity",
+        [r"\b(advanced|early) warnings?\b", r"\bseverit", r"\bwarnings?\b"],
+        ["get_reports_by_severity", "get_report_counts", "get_all_asset_severity_data", "get_all_system_severity_data"],
+    ),
+    QueryRoute(
+        "comments",
+        [r"\bcomments?\b", r"\bnotes?\b", r"\bremarks?\b"],
+        ["get_asset_comments", "get_report_comments", "get_all_report_comments", "get_asset_ids_names",
+         "get_all_report_data_from_asset_names"],
+    ),
+    QueryRoute(
+        "asset",
+        [r"\b[a-z]\d+\b", r"\breport (id )?#?\d+\b", r"\basset\b"],
+        ["get_all_report_data_from_asset_names", "get_all_report_data_from_asset_names_full", "get_single_report_data",
+         "get_report_counts", "get_asset_ids_names"],
+    ),
+    QueryRoute(
+        "system",
+        [r"\bsystems?\b", r"\bgearbox", r"\bbearing", r"\bgenerator", r"\bpitch\b", r"\byaw\b", r"\btransformer", r"\bcooling\b"],
+        ["get_system_list_for_site", "get_all_asset_names_from_system_id", "get_all_system_severity_data", "get_report_counts"],
+    ),
+    # Questions that need reading report details and reasoning about them go straight to the large model
+    QueryRoute(
+        "diagnosis",
+        [r"\bwhy\b", r"\bcaus", r"\bdiagnos", r"\brecommend", r"\bexplain", r"\bwhat('s| is) wrong\b", r"\broot cause\b",
+         r"\bshould (we|i)\b", r"\bsummar"],
+        ["get_all_report_data_from_asset_names", "get_all_report_data_from_asset_names_full", "get_single_report_data",
+         "get_report_comments", "get_asset_comments", "get_all_asset_severity_data", "get_asset_ids_names"],
+        tier="large",
+    ),
+]
+
+_schema_cache = {}
+
+
+def tool_schemas(tool_names):
+    """Schemas for a set of tool names in registry order, with their token cost. Cached per set, so never mutate them."""
+    key = frozenset(tool_names)
+    cached = _schema_cache.get(key)
+    if cached is None:
+        schemas = TOOLS if key >= set(TOOL_REGISTRY) else [tool.schema for name, tool in TOOL_REGISTRY.items() if name in key]
+        cached = _schema_cache[key] = (schemas, count_text_tokens(json.dumps(schemas)))
+    return cached
+
+
+def is_error_result(function_response):
+    return isinstance(function_response, str) and function_response.startswith(ERROR_PREFIXES)
+
+
+def is_unavailable_result(function_response):
+    return isinstance(function_response, str) and function_response.startswith(UNAVAILABLE_PREFIX)
+
+
+class RouteDecision:
+    """
+    The route chosen for one query, and its escalation to the large model with every tool when the cheap route falls short.
+
+    The conversation loops ask it for the model and tools before each turn and report each turn back, so the
+    decision, its escalations and its token and latency effects are recorded in one place.
+    """
+
+    def __init__(self, route, tool_names, tier, rules=()):
+        self.route = route
+        self.tier = tier
+        self.rules = list(rules)
+        self.escalations = []
+        self.tools, self.schema_tokens = tool_schemas(tool_names)
+        self.full_schema_tokens = tool_schemas(TOOL_REGISTRY)[1]
+        self.started = time.perf_counter()
+        ROUTE_DECISIONS.inc(route=route, tier=tier)
+        trace_incr(f"route_{route}")
+
+    @property
+    def model(self):
+        return MODEL_TIERS[self.tier]
+
+    def escalate(self, reason):
+        """Switch to the large model with every tool. Returns False if the query already has both."""
+        if self.tier == "large" and self.tools is TOOLS:
+            return False
+        logger.info("Escalating %s route to %s: %s", self.route, MODEL_TIERS["large"], reason)
+        self.tier = "large"
+        self.tools, self.schema_tokens = TOOLS, self.full_schema_tokens
+        self.escalations.append(reason)
+        ROUTE_ESCALATIONS.inc(route=self.route, reason=reason)
+        trace_incr("route_escalations")
+        return True
+
+    def before_turn(self, depth):
+        """Called before each model turn; a small-tier route that has not answered after a few turns escalates."""
+        if self.tier == "small" and depth >= ROUTING_ESCALATE_AFTER_DEPTH:
+            self.escalate("depth")
+        ROUTE_SCHEMA_TOKENS.inc(self.schema_tokens, route=self.route)
+
+    def after_turn(self, response):
+        """Record a model turn's token usage against the route."""
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            ROUTE_MODEL_TOKENS.inc(usage.prompt_tokens, route=self.route, model=self.model, type="prompt")
+            ROUTE_MODEL_TOKENS.inc(usage.completion_tokens, route=self.route, model=self.model, type="completion")
+
+    def after_tools(self, function_responses):
+        """
+        Escalate when a tool call failed on a cheap route, since the large model with every tool may recover.
+
+        Calls that failed because the upstream was overloaded or slow do not escalate: a larger model with a larger
+        prompt would only add to the load.
+        """
+        if any(is_error_result(function_response) and not is_unavailable_result(function_response)
+               for function_response in function_responses):
+            self.escalate("tool_error")
+
+    def accept_answer(self, content):
+        """Whether a final answer can be returned; an empty answer from a cheap route escalates and retries instead."""
+        if content:
+            return True
+        return not self.escalate("empty_answer")
+
+    def finish(self):
+        ROUTE_SECONDS.observe(time.perf_counter() - self.started, route=self.route, model=self.model)
+
+    def summary(self):
+        return {
+            "route": self.route,
+            "rules": self.rules,
+            "model": self.model,
+            "escalations": list(self.escalations),
+            "schema_tokens": self.schema_tokens,
+            "schema_tokens_saved": self.full_schema_tokens - self.schema_tokens,
+        }
+
+
+def route_query(user_query, enabled=ROUTING_ENABLED):
+    """
+    Classify a query with the keyword rules in ROUTES and choose its tools and model tier.
+
+    A query matching several routes gets the union of their tools and the largest of their tiers. A query matching
+    none, or any query when routing is disabled, gets every tool and the large model.
+
+    Returns:
+        RouteDecision: The decision, to be passed to the conversation loop.
+    """
+    if not enabled:
+        return RouteDecision("all", TOOL_REGISTRY, "large")
+
+    query = (user_query or "").lower()
+    matched = [route for route in ROUTES if route.matches(query)]
+    if not matched:
+        return RouteDecision("general", TOOL_REGISTRY, "large")
+
+    tool_names = {name for route in matched for name in route.tools}
+    tier = "large" if any(route.tier == "large" for route in matched) else "small"
+    return RouteDecision("+".join(route.name for route in matched), tool_names, tier, [route.name for route in matched])
@@ -1,60 +1,204 @@
+import os
 import sys
-import requests
-from openai import OpenAI
+import logging
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import json
 
 sys.path.append('C:/projects/python/gpt-database-wrapper')
 
-from src.models.handle_functions import handle_function_call
-from src.models.tools import define_tools
+from src.services.handle_functions import handle_function_call, timeout_result
+from src.services.routing import route_query, is_error_result
+from src.services.context import compact_messages, CONTEXT_TOKEN_BUDGET
+from src.services.result_shaping import encode_tool_result
+from src.services.prefetch import prefetch_followups
+from src.services.model_client import get_model_client, model_timeout
+from src.util.metrics import span, record_usage, trace_incr, QUERY_DEPTH
+from src.util.admission import model_limiter, backend_limiter, call_with_retries, budget_exhausted, clamp_to_budget, narrow_budget, end_budget, FINAL_ANSWER_RESERVE
+
+logger = logging.getLogger(__name__)
+
+# Most tool calls one query runs at once (the async path's per-query cap)
+TOOL_MAX_WORKERS = int(os.getenv('TOOL_MAX_WORKERS', 8))
+TOOL_CALL_TIMEOUT = float(os.getenv('TOOL_CALL_TIMEOUT', 30))
+# Tool calls from every request are dispatched on one shared pool. It is at least as large as the backend's admission
+# cap, so under concurrent load tool calls queue in the backend limiter (which sheds load) rather than behind the pool.
+TOOL_POOL_WORKERS = int(os.getenv('TOOL_POOL_WORKERS', max(TOOL_MAX_WORKERS, backend_limiter.max_concurrency)))
+
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_POOL_WORKERS, thread_name_prefix="tool-call")
+
+
+def _call_within(deadline, api, function_name, function_args):
+    # A running future cannot be cancelled, so the call's own backend requests are held to the caller's deadline
+    # instead. Time spent queued for a worker counts against it.
+    token = narrow_budget(deadline - time.monotonic())
+    try:
+        return handle_function_call(api, function_name, function_args)
+    finally:
+        end_budget(token)
+
+
+def submit_tool_calls(api, tool_calls, timeout=TOOL_CALL_TIMEOUT):
+    """
+    Submits the tool calls of a single model turn to the shared pool.
+
+    Args:
+        api (ApplicationAPI): The API the tools are called against.
+        tool_calls (list): The tool calls returned by the model.
+        timeout (float): Seconds from now that the calls may take, queueing included; their backend requests time
+                         out when they are up.
+
+    Returns:
+        list: (function_name, function_args, future, error) tuples in the same order as tool_calls.
+              future is None when the arguments could not be parsed, in which case error holds the reason.
+    """
+    deadline = time.monotonic() + timeout
+    pending = []
+    for tool_call in tool_calls:
+        function_name = tool_call.function.name
+        try:
+            function_args = json.loads(tool_call.function.arguments) if tool_call.function.arguments else {}
+        except ValueError:
+            pending.append((function_name, None, None, "Invalid JSON arguments."))
+            continue
+        # Run in a copy of the caller's context so the tool's spans land in the query's trace
+        future = _tool_executor.submit(contextvars.copy_context().run, _call_within, deadline, api, function_name, function_args)
+        pending.append((function_name, function_args, future, None))
+    return pending
+
+
+def tool_call_result(function_name, future, error, timeout=TOOL_CALL_TIMEOUT, deadline=None):
+    """
+    Waits for a submitted tool call and returns its response, or an error string if it failed to start or timed out.
+
+    The wait ends after timeout seconds, or at deadline (a time.monotonic() value) when one is given.
+    """
+    if future is None:
+        return error
+    wait = timeout if deadline is None else max(0.0, deadline - time.monotonic())
+    try:
+        function_response, _ = future.result(timeout=wait)
+    except FutureTimeoutError:
+        future.cancel()
+        function_response = timeout_result(function_name, timeout)
+    return function_response
+
+
+def run_tool_calls(api, tool_calls, timeout=TOOL_CALL_TIMEOUT):
+    """
+    Runs the tool calls of a single model turn concurrently.
+
+    Args:
+        api (ApplicationAPI): The API the tools are called against.
+        tool_calls (list): The tool calls returned by the model.
+        timeout (float): Seconds to wait for all the calls before giving up on those still running.
+
+    Returns:
+        list: (function_name, function_response) pairs in the same order as tool_calls.
+    """
+    # One deadline for the whole turn, so waiting on each call in turn does not add up their timeouts
+    deadline = time.monotonic() + timeout
+    return [
+        (function_name, tool_call_result(function_name, future, error, timeout, deadline))
+        for function_name, _, future, error in submit_tool_calls(api, tool_calls, timeout)
+    ]
+
+
+def run_conversation(api, user_query, introduction, max_depth, GPT_API_KEY, session_messages=None, tool_timeout=TOOL_CALL_TIMEOUT,
+                     token_budget=CONTEXT_TOKEN_BUDGET, context_stats=None, result_stats=None, route=None, outcome=None):
+    """
+    Run the tool loop for one query and return (response, session_messages).
+
+    If outcome is given it is filled with tool_errors (tool results that were errors, including timeouts and
+    rejections) and budget_stopped (whether the time budget forced the final answer), so callers can tell an answer
+    built from partial data from a complete one.
+    """
+    client = get_model_client(GPT_API_KEY)
+    if outcome is None:
+        outcome = {}
+    outcome.update(tool_errors=0, budget_stopped=False)
 
-def run_conversation(api, user_query, introduction, max_depth, GPT_API_KEY, session_messages=None):
-    
-    client = OpenAI(api_key=GPT_API_KEY,)
-    
     if session_messages is None:
         session_messages = []
 
     # Start the conversation or add to it
     if not session_messages:  # This checks if the list is empty
         session_messages.append({"role": "system", "content": introduction})
-    
+
     # Always append the user query as a new entry in the conversation
     session_messages.append({"role": "user", "content": user_query})
 
-    # Define tools based on context
-    tools = define_tools()
-    
+    # Pick the tools and model tier for this query; route.summary() reports what was chosen
+    if route is None:
+        route = route_query(user_query)
+
     depth = 0  # Initialize depth counter
-    
+
     while depth < max_depth:
-        # Call the GPT model with current session messages and tools
-        response = client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=session_messages,
-            tools=tools,
-            tool_choice="auto",
-        )
+        # Escalation may change the tools, so decide them first; their schemas count against the budget
+        route.before_turn(depth)
+
+        # Keep the prompt within budget by compacting old tool results
+        stats = compact_messages(session_messages, token_budget, reserved=route.schema_tokens)
+        stats["depth"] = depth
+        logger.info("Context tokens at depth %d: %d before compaction, %d after (%d results compacted)",
+                    depth, stats["tokens_before"], stats["tokens_after"], stats["compacted"])
+        if context_stats is not None:
+            context_stats.append(stats)
+
+        # Once the request's time budget is nearly spent, stop calling tools and answer from what has been gathered
+        out_of_time = budget_exhausted(FINAL_ANSWER_RESERVE)
+        if out_of_time:
+            logger.warning("Time budget nearly spent at depth %d, asking for a final answer", depth)
+            trace_incr("budget_stops")
+            outcome["budget_stopped"] = True
+
+        # Call the GPT model with current session messages and the route's tools
+        with span("model", route.model, depth=depth) as record:
+            response = call_with_retries(
+                model_limiter,
+                client.chat.completions.create,
+                model=route.model,
+                messages=session_messages,
+                tools=route.tools,
+                tool_choice="none" if out_of_time else "auto",
+                timeout=model_timeout(),
+            )
+            record_usage(record, response)
+        route.after_turn(response)
 
         # Check the finish reason of the response
         finish_reason = response.choices[0].finish_reason
-        
+
         if finish_reason == "stop":
+            # An empty answer from a cheap route is retried on the large model before giving up
+            if not out_of_time and not route.accept_answer(response.choices[0].message.content):
+                depth += 1
+                continue
             # If finish_reason is 'stop', return the response and end the loop
+            QUERY_DEPTH.observe(depth)
+            trace_incr("depth", depth)
+            route.finish()
             return response, session_messages
         elif finish_reason == "tool_calls":
-            # Handle tool calls and continue the loop
+            # Handle tool calls concurrently, then append the results in the order the model asked for them
             tool_calls = response.choices[0].message.tool_calls
-            for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_args = json.loads(tool_call.function.arguments) if tool_call.function.arguments else {}
-                function_response = handle_function_call(api, function_name, function_args)
-                session_messages.append({"role": "system", "name": function_name, "content": json.dumps(function_response)})
+            results = run_tool_calls(api, tool_calls, clamp_to_budget(tool_timeout, FINAL_ANSWER_RESERVE))
+            for function_name, function_response in results:
+                # Warm the lookups the model is likely to ask for next while it reads this result
+                prefetch_followups(api, function_name, function_response)
+                session_messages.append({"role": "system", "name": function_name, "content": encode_tool_result(function_name, function_response, result_stats)})
+            outcome["tool_errors"] += sum(is_error_result(function_response) for _, function_response in results)
+            route.after_tools([function_response for _, function_response in results])
             depth += 1  # Increment depth after each cycle
         else:
             # Continue if other reasons but log unexpected behavior
             break
 
+    QUERY_DEPTH.observe(depth)
+    trace_incr("depth", depth)
+    route.finish()
+
     # This point should not be reached if while loop is correctly configured
     return None, session_messages
-
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+SESSION_STORE = os.getenv('SESSION_STORE', 'memory')
+SESSION_TTL = int(os.getenv('SESSION_TTL', 60 * 60 * 24))
+SESSION_MAXSIZE = int(os.getenv('SESSION_MAXSIZE', 1000))
+SESSION_STORE_PATH = os.getenv('SESSION_STORE_PATH', 'sessions.sqlite3')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+class SessionStore(ABC):
+    """
+    Server-side store for conversation histories, keyed by session ID.
+
+    Subclasses implement load/save/delete; one missing any of them cannot be constructed. Messages are stored as a
+    JSON-serialisable list of message dicts.
+    """
+
+    @abstractmethod
+    def load(self, session_id):
+        """Return the stored messages for session_id, or None if the session is unknown or expired."""
+
+    @abstractmethod
+    def save(self, session_id, messages):
+        """Store messages for session_id, replacing any earlier history and restarting its TTL."""
+
+    @abstractmethod
+    def delete(self, session_id):
+        """Forget session_id. Deleting an unknown session is not an error."""
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store with TTL expiry and LRU eviction. Sessions are lost on restart and not shared between processes."""
+
+    def __init__(self, maxsize=SESSION_MAXSIZE, ttl=SESSION_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # session_id -> (expires_at, messages)
+        self._lock = threading.Lock()
+
+    def load(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return list(entry[1])
+
+    def save(self, session_id, messages):
+        with self._lock:
+            self._sessions[session_id] = (time.monotonic() + self.ttl, list(messages))
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Store backed by a single SQLite file, so sessions survive restarts and can be shared by workers on one host."""
+
+    def __init__(self, path=SESSION_STORE_PATH, ttl=SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, messages TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def load(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT messages FROM sessions WHERE session_id = ? AND expires_at > ?", (session_id, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id, messages):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, messages, expires_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(messages), time.time() + self.ttl),
+            )
+            # Opportunistically clear out expired sessions
+            self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Store on any client exposing the Redis get/set(ex=)/delete interface, e.g. redis.Redis or FakeRedis.
+    """
+
+    def __init__(self, client, ttl=SESSION_TTL, prefix="gpt-session:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def load(self, session_id):
+        raw = self.client.get(self.prefix + session_id)
+        if raw is None:
+            return None
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        return json.loads(raw)
+
+    def save(self, session_id, messages):
+        self.client.set(self.prefix + session_id, json.dumps(messages), ex=self.ttl)
+
+    def delete(self, session_id):
+        self.client.delete(self.prefix + session_id)
+
+
+class FakeRedis:
+    """Minimal local stand-in for a Redis client, implementing only what RedisSessionStore uses."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        with self._lock:
+            self._data[name] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._data.pop(name, None) is not None)
+
+
+def create_session_store(kind=SESSION_STORE):
+    """
+    Build the session store selected by SESSION_STORE.
+
+    Args:
+        kind (str): One of 'memory', 'sqlite', 'redis' or 'fakeredis'.
+
+    Returns:
+        SessionStore: The configured store.
+    """
+    if kind == "memory":
+        return MemorySessionStore()
+    if kind == "sqlite":
+        return SQLiteSessionStore()
+    if kind == "redis":
+        import redis
+        return RedisSessionStore(redis.Redis.from_url(REDIS_URL))
+    if kind == "fakeredis":
+        return RedisSessionStore(FakeRedis())
+    raise ValueError(f"Unknown session store: {kind}")
@@ -0,0 +1,153 @@
+import json
+import time
+from types import SimpleNamespace
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from src.services.run_converstaion import submit_tool_calls, tool_call_result, TOOL_CALL_TIMEOUT
+from src.services.handle_functions import timeout_result
+from src.services.routing import route_query
+from src.services.context import compact_messages, CONTEXT_TOKEN_BUDGET
+from src.services.result_shaping import encode_tool_result
+from src.services.prefetch import prefetch_followups
+from src.services.model_client import get_model_client, model_timeout
+from src.util.metrics import span, record_usage, trace_incr
+from src.util.admission import model_limiter, call_with_retries, budget_exhausted, clamp_to_budget, FINAL_ANSWER_RESERVE
+
+# Marks tool calls that have not produced a result yet; a tool may legitimately return None
+_PENDING = object()
+
+
+def _merge_tool_call_deltas(tool_calls, deltas):
+    # Streamed tool calls arrive in fragments keyed by index; the name and arguments are built up piece by piece
+    for delta in deltas:
+        call = tool_calls.setdefault(delta.index, SimpleNamespace(id=None, function=SimpleNamespace(name="", arguments="")))
+        if delta.id:
+            call.id = delta.id
+        if delta.function is not None:
+            if delta.function.name:
+                call.function.name += delta.function.name
+            if delta.function.arguments:
+                call.function.arguments += delta.function.arguments
+
+
+def stream_conversation(api, user_query, introduction, max_depth, GPT_API_KEY, session_messages=None, tool_timeout=TOOL_CALL_TIMEOUT,
+                        token_budget=CONTEXT_TOKEN_BUDGET, result_stats=None, route=None):
+    """
+    Streaming counterpart of run_conversation.
+
+    Runs the same tool loop but yields events as it goes, so the caller can forward progress to the client:
+
+    - ("turn", {"depth"}) before each model call
+    - ("tool_start", {"index", "name", "arguments"}) when a tool call is dispatched
+    - ("tool_end", {"index", "name", "duration_ms", "bytes"}) when it finishes
+    - ("token", {"content"}) for each fragment of the final answer
+    - ("done", {"response", "finish_reason", "route"}) once the answer is complete
+
+    session_messages is updated in place, exactly as run_conversation does.
+    """
+    client = get_model_client(GPT_API_KEY)
+
+    if session_messages is None:
+        session_messages = []
+
+    if not session_messages:
+        session_messages.append({"role": "system", "content": introduction})
+
+    session_messages.append({"role": "user", "content": user_query})
+
+    if route is None:
+        route = route_query(user_query)
+
+    depth = 0
+
+    while depth < max_depth:
+        route.before_turn(depth)
+        compact_messages(session_messages, token_budget, reserved=route.schema_tokens)
+        yield "turn", {"depth": depth}
+
+        content = []
+        tool_calls = {}
+        finish_reason = None
+        out_of_time = budget_exhausted(FINAL_ANSWER_RESERVE)
+        if out_of_time:
+            trace_incr("budget_stops")
+        usage = None
+        with span("model", route.model, depth=depth, stream=True) as record:
+            # Admission covers opening the stream; reading it does not hold a model slot
+            stream = call_with_retries(
+                model_limiter,
+                client.chat.completions.create,
+                model=route.model,
+                messages=session_messages,
+                tools=route.tools,
+                tool_choice="none" if out_of_time else "auto",
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=model_timeout(),
+            )
+
+            for chunk in stream:
+                # With include_usage the last chunk has no choices and carries the turn's token usage
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                if choice.delta.content:
+                    content.append(choice.delta.content)
+                    yield "token", {"content": choice.delta.content}
+                if choice.delta.tool_calls:
+                    _merge_tool_call_deltas(tool_calls, choice.delta.tool_calls)
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+
+            turn = SimpleNamespace(usage=usage)
+            record_usage(record, turn)
+        route.after_turn(turn)
+
+        if finish_reason == "tool_calls":
+            ordered_calls = [tool_calls[index] for index in sorted(tool_calls)]
+            timeout = clamp_to_budget(tool_timeout, FINAL_ANSWER_RESERVE)
+            pending = submit_tool_calls(api, ordered_calls, timeout)
+            started = time.monotonic()
+            for index, (function_name, function_args, _, _) in enumerate(pending):
+                yield "tool_start", {"index": index, "name": function_name, "arguments": function_args}
+
+            # Report each call as soon as it finishes, then append all results in the order the model asked for them
+            remaining = {future: index for index, (_, _, future, _) in enumerate(pending) if future is not None}
+            deadline = started + timeout
+            results = [_PENDING] * len(pending)
+            while remaining and time.monotonic() < deadline:
+                done, _ = wait(list(remaining), timeout=deadline - time.monotonic(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = remaining.pop(future)
+                    function_name, _, _, error = pending[index]
+                    results[index] = tool_call_result(function_name, future, error, 0)
+                    yield "tool_end", {
+                        "index": index,
+                        "name": function_name,
+                        "duration_ms": round((time.monotonic() - started) * 1000, 1),
+                        "bytes": len(json.dumps(results[index])),
+                    }
+
+            for index, (function_name, _, future, error) in enumerate(pending):
+                if results[index] is _PENDING:
+                    if future is not None:
+                        future.cancel()
+                        error = timeout_result(function_name, timeout)
+                    results[index] = error
+                    yield "tool_end", {"index": index, "name": function_name, "duration_ms": None, "bytes": 0}
+                prefetch_followups(api, function_name, results[index])
+                session_messages.append({"role": "system", "name": function_name, "content": encode_tool_result(function_name, results[index], result_stats)})
+            route.after_tools(results)
+            depth += 1
+        elif finish_reason == "stop" and not out_of_time and not route.accept_answer("".join(content)):
+            # Nothing was streamed, so the large model can retry without the client seeing two answers
+            depth += 1
+        else:
+            route.finish()
+            yield "done", {"response": "".join(content), "finish_reason": finish_reason, "route": route.summary()}
+            return
+
+    route.finish()
+    yield "done", {"response": None, "finish_reason": "max_depth", "route": route.summary()}
@@ -1,151 +1,234 @@
-def define_tools():
+import json
+
+
+class Tool:
     """
-    Dynamically define the list of tools available based on the context of the conversation.
+    A single tool declaration: the name the model sees, the ApplicationAPI method it calls and its arguments.
+
+    Both the OpenAI tool schema and the dispatcher entry are derived from this one declaration.
+
     Args:
-    context (dict): The context dictionary containing keys like 'data_collected' and 'data_needed'.
-    
-    Returns:
-    list: A list of tool definitions that should be available for the next step.
+        name (str): Tool name exposed to the model.
+        description (str): Description exposed to the model.
+        params (list): (argument name, JSON type, description) tuples, passed to the method positionally in order.
+        method (str): ApplicationAPI method to call. Defaults to the tool name.
+        aliases (dict): Alternative argument names the model sometimes uses, mapped to the declared name.
+        optional (list): Names of params that may be omitted.
+        projection (dict): Output field -> dotted source path kept when the result is shaped for the model.
+        max_rows (int): Row cap applied when the result is shaped for the model.
     """
-    tools = []
-    
-    tools.append({
-        "type": "function",
-        "function": {
-            "name": "get_all_system_severity_data",
-            "description": "Fetch high level details on the severities of all the systems in the site. Severity2 is advanced warning, Severity1 is early warning, and Severity0 is no warning.",
-            "parameters": {},
-        }
-    })
-
-    tools.append({
-        "type": "function",
-        "function": {
-            "name": "get_number_of_assets",
-            "description": "Get number of assets at the site.",
-            "parameters": {},
-        }
-    })
-
-    tools.append({
-        "type": "function",
-        "function": {
-            "name": "get_number_of_reports",
-            "description": "Get number of reports at the site.",
-            "parameters": {},
-        }
-    })
-
-    tools.append({
-        "type": "function",
-        "function": {
-            "name": "get_all_asset_severity_data",
-            "description": "Asset information sorted from most severe to least severe.",
-            "parameters": {},
-        }
-    })
-
-    tools.append({
-        "type": "function",
-        "function": {
-            "name": "get_all_report_data_from_asset_names",
-            "description": "Fetch all reports for a given asset name. You can use the assetName here to find the specific report IDs for specific systems and feed it into get_single_report_data",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "assetName": {"type": "string", "description": "Asset name to fetch reports for"},
-                },
-                "required": ["assetName"],
-            }
-        }
-    })
-
-    tools.append({
-        "type": "function",
-        "function": {
-            "name": "get_all_report_data_from_asset_names_full",
-            "description": "Fetch all reports for a given asset name. You can use the assetName here to find the specific report IDs for specific systems and feed it into get_single_report_data. You only need this data if you require reports older than the most recent.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "assetName": {
-                        "type": "string",
-                        "description": "The name of the asset in the format e.g. F2",
-                    },
-                },
-                "required": ["assetName"],
-            },
-        }
-    })
-
-    tools.append({
-        "type": "function",
-        "function": {
-            "name": "get_single_report_data",
-            "description": "Fetch details of a single report that relates to a single asset and system. This call provides mode information on what is causing problems.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "reportID": {"type": "string", "description": "The ID of the report to fetch"},
-                },
-                "required": ["reportID"],
-            }
-        }
-    })
-
-    tools.append({
-        "type": "function",
-        "function": {
-            "name": "get_asset_ids_names",
-            "description": "Provides information on all the asset names and IDs. Useful to getting the paramaters for hyperlinks",
-            "parameters": {},
-        }
-    })
-
-    
-    tools.append({
-        "type": "function",
-        "function": {
-            "name": "get_asset_comments",
-            "description": "Fetch all comments made against a specific asset.",
-            "parameters": {
+
+    def __init__(self, name, description, params=None, method=None, aliases=None, optional=None, projection=None, max_rows=None):
+        self.name = name
+        self.description = description
+        self.params = params or []
+        self.method = method or name
+        self.aliases = aliases or {}
+        self.optional = set(optional or [])
+        self.projection = projection
+        self.max_rows = max_rows
+        self.schema = self._build_schema()
+
+    def _build_schema(self):
+        if self.params:
+            parameters = {
                 "type": "object",
                 "properties": {
-                    "entityId": {
-                        "type": "string",
-                        "description": "The ID of the asset to fetch comments for."
-                    },
+                    arg: {"type": arg_type, "description": description} for arg, arg_type, description in self.params
                 },
-                "required": ["assetID"]
+                "required": [arg for arg, _, _ in self.params if arg not in self.optional],
             }
-        }
-    })
-
-    tools.append({
-        "type": "function",
-        "function": {
-            "name": "get_report_comments",
-            "description": "Return all user comments made against a specific report.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "entityId": {
-                        "type": "string",
-                        "description": "The ID of the report to fetch comments for."
-                    },
-                },
-                "required": ["reportID"]
+        else:
+            parameters = {}
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": parameters,
             }
         }
-    })
-
-    tools.append({
-        "type": "function",
-        "function": {
-            "name": "get_all_report_comments",
-            "description": "Get all comments for reports within the site.",
-            "parameters": {}
-        }
-    })
 
-    return tools
+    def resolve_args(self, function_args):
+        """Map the model's arguments onto the declared params, accepting aliases. Returns (args, missing argument name)."""
+        function_args = dict(function_args)
+        for alias, arg in self.aliases.items():
+            if alias in function_args and arg not in function_args:
+                function_args[arg] = function_args[alias]
+        args = []
+        for arg, _, _ in self.params:
+            if arg in function_args:
+                args.append(function_args[arg])
+            elif arg in self.optional:
+                args.append(None)
+            else:
+                return None, arg
+        return args, None
+
+    def call(self, api, function_args):
+        args, missing = self.resolve_args(function_args)
+        if missing is not None:
+            return f"Argument {missing} missing for {self.name}."
+        return getattr(api, self.method)(*args)
+
+
+# Fields of a report row the model actually uses; the nested site, upload and fileType data is dropped
+REPORT_ROW_FIELDS = {
+    "id": "id",
+    "date": "date",
+    "asset": "asset.name",
+    "asset_id": "asset.id",
+    "system": "systems.name",
+    "system_id": "systems.system_id",
+    "severity": "severity.severity",
+    "severity_count": "severity.severity_count",
+}
+
+# Tool name -> Tool. Built once at import time and shared by every request.
+TOOL_REGISTRY = {}
+
+
+def register_tool(tool):
+    TOOL_REGISTRY[tool.name] = tool
+    return tool
+
+
+register_tool(Tool(
+    "get_all_system_severity_data",
+    "Fetch high level details on the severities of all the systems in the site. Severity2 is advanced warning, Severity1 is early warning, and Severity0 is no warning.",
+))
+
+register_tool(Tool(
+    "get_number_of_assets",
+    "Get number of assets at the site.",
+))
+
+register_tool(Tool(
+    "get_number_of_reports",
+    "Get number of reports at the site.",
+))
+
+register_tool(Tool(
+    "get_all_asset_severity_data",
+    "Asset information sorted from most severe to least severe.",
+    max_rows=10,
+))
+
+register_tool(Tool(
+    "get_all_report_data_from_asset_names",
+    "Fetch all reports for a given asset name. You can use the assetName here to find the specific report IDs for specific systems and feed it into get_single_report_data",
+    [("assetName", "string", "Asset name to fetch reports for")],
+    projection=REPORT_ROW_FIELDS,
+))
+
+register_tool(Tool(
+    "get_all_report_data_from_asset_names_full",
+    "Fetch all reports for a given asset name. You can use the assetName here to find the specific report IDs for specific systems and feed it into get_single_report_data. You only need this data if you require reports older than the most recent.",
+    [("assetName", "string", "The name of the asset in the format e.g. F2")],
+    projection=REPORT_ROW_FIELDS,
+))
+
+register_tool(Tool(
+    "get_single_report_data",
+    "Fetch details of a single report that relates to a single asset and system. This call provides mode information on what is causing problems.",
+    [("reportID", "string", "The ID of the report to fetch")],
+    projection=dict(REPORT_ROW_FIELDS, comments="comments"),
+))
+
+register_tool(Tool(
+    "get_asset_ids_names",
+    "Provides information on all the asset names and IDs. Useful to getting the paramaters for hyperlinks",
+))
+
+register_tool(Tool(
+    "get_asset_comments",
+    "Fetch all comments made against a specific asset.",
+    [("entityId", "string", "The ID of the asset to fetch comments for.")],
+    aliases={"assetID": "entityId"},
+))
+
+register_tool(Tool(
+    "get_report_comments",
+    "Return all user comments made against a specific report.",
+    [("entityId", "string", "The ID of the report to fetch comments for.")],
+    aliases={"reportID": "entityId"},
+))
+
+register_tool(Tool(
+    "get_all_report_comments",
+    "Get all comments for reports within the site.",
+))
+
+register_tool(Tool(
+    "get_system_list_for_site",
+    "List every system at the site with its system ID.",
+))
+
+register_tool(Tool(
+    "get_all_asset_names_from_system_id",
+    "Fetch the names and IDs of all assets that have a given system. Use get_system_list_for_site to find system IDs.",
+    [("systemId", "string", "The ID of the system")],
+))
+
+register_tool(Tool(
+    "get_reports_by_severity",
+    "Find reports by severity level, optionally only those on or after a date and for one asset, e.g. all advanced warnings since 2024-01-01. Severity 2 is advanced warning, 1 is early warning, 0 is no warning.",
+    [
+        ("severity", "integer", "Severity level to match: 0, 1 or 2"),
+        ("sinceDate", "string", "Only include reports dated on or after this date, format YYYY-MM-DD"),
+        ("assetName", "string", "Only include reports for this asset, e.g. F2"),
+    ],
+    optional=["sinceDate", "assetName"],
+    projection=REPORT_ROW_FIELDS,
+))
+
+# Aggregates computed locally over the site's report list, so one call replaces a chain of lookups and manual counting
+register_tool(Tool(
+    "get_report_counts",
+    "Count reports and how many are at each severity (no_warning, early_warning, advanced_warning), grouped by asset, system and/or period. E.g. groupBy \"system\" with assetName F3 answers how many advanced warnings each system on F3 has had.",
+    [
+        ("groupBy", "string", "Comma-separated columns to group by: asset, system, period. E.g. \"asset,system\""),
+        ("sinceDate", "string", "Only count reports dated on or after this date, format YYYY-MM-DD"),
+        ("untilDate", "string", "Only count reports dated on or before this date, format YYYY-MM-DD"),
+        ("assetName", "string", "Only count reports for this asset, e.g. F2"),
+        ("period", "string", "Bucket size when grouping by period: day, week, month (default) or year"),
+    ],
+    optional=["sinceDate", "untilDate", "assetName", "period"],
+))
+
+register_tool(Tool(
+    "get_severity_trend",
+    "How the number of reports at each severity changes over time, one row per period, oldest first. Use to tell whether a site or asset is getting better or worse.",
+    [
+        ("period", "string", "Bucket size: day, week, month (default) or year"),
+        ("sinceDate", "string", "Only include reports dated on or after this date, format YYYY-MM-DD"),
+        ("assetName", "string", "Only include reports for this asset, e.g. F2"),
+    ],
+    optional=["period", "sinceDate", "assetName"],
+))
+
+register_tool(Tool(
+    "get_worst_assets",
+    "The assets in the worst condition, ranked by how many of their systems are at advanced warning, then early warning, in each system's latest report.",
+    [
+        ("limit", "integer", "How many assets to return, default 5"),
+        ("sinceDate", "string", "Only consider reports dated on or after this date, format YYYY-MM-DD"),
+    ],
+    optional=["limit", "sinceDate"],
+))
+
+# The schema list sent to the model, and its serialised form for sizing prompts. Shared, so never mutate them.
+TOOLS = [tool.schema for tool in TOOL_REGISTRY.values()]
+TOOLS_JSON = json.dumps(TOOLS)
+
+
+def define_tools():
+    """
+    Returns the tool definitions exposed to the model.
+
+    The list is built once from TOOL_REGISTRY at import time and shared across requests, so callers must not modify it.
+
+    Returns:
+    list: A list of tool definitions that should be available for the next step.
+    """
+    return TOOLS
@@ -0,0 +1,79 @@
+import os
+import time
+import logging
+import threading
+
+from src.services.tools import define_tools, TOOLS_JSON
+from src.services.context import count_text_tokens
+from src.services.model_client import get_model_client
+from src.util.http_session import get_session, DEFAULT_TIMEOUT
+from src.util.database_API_connection import DEFAULT_BASE_URL
+
+logger = logging.getLogger(__name__)
+
+# Opening the model connection costs one cheap models.list() call; turn it off where that is unwanted
+WARM_UP_MODEL_CONNECTION = os.getenv('WARM_UP_MODEL_CONNECTION', '1') not in ('0', 'false', 'False')
+
+
+class WarmUp:
+    """
+    Startup warm-up: builds the tool schemas, the shared model client and the pooled connections before traffic arrives.
+
+    Readiness only flips once every step has run. A failed step is logged and reported but does not block readiness,
+    since the request path builds whatever is missing on demand.
+    """
+
+    def __init__(self):
+        self.steps = {}
+        self.duration_ms = None
+        self._done = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def _step(self, name, fn):
+        started = time.perf_counter()
+        try:
+            detail = fn()
+            self.steps[name] = {"status": "ok", "detail": detail}
+        except Exception as e:
+            logger.warning("Warm-up step %s failed: %s", name, e)
+            self.steps[name] = {"status": "failed", "detail": str(e)}
+        self.steps[name]["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    def run(self, api_key, base_url=DEFAULT_BASE_URL):
+        """Run every warm-up step in the calling thread, then mark the process ready."""
+        started = time.perf_counter()
+        self._step("tools", lambda: {"tools": len(define_tools()), "schema_tokens": count_text_tokens(TOOLS_JSON)})
+
+        def open_model_connection():
+            client = get_model_client(api_key)
+            if WARM_UP_MODEL_CONNECTION:
+                client.models.list()
+            return {"connected": WARM_UP_MODEL_CONNECTION}
+
+        def open_backend_connection():
+            # Any status will do: the point is an established keep-alive connection in the pool
+            response = get_session(base_url).head(base_url, timeout=DEFAULT_TIMEOUT)
+            return {"status": response.status_code}
+
+        self._step("model", open_model_connection)
+        self._step("backend", open_backend_connection)
+        self.duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        self._done.set()
+        logger.info("Warm-up finished in %.1f ms", self.duration_ms)
+
+    def start(self, api_key, base_url=DEFAULT_BASE_URL):
+        """Run the warm-up in a background thread so the server can start accepting health checks at once."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, args=(api_key, base_url), name="warm-up", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def status(self):
+        return {"ready": self.ready, "duration_ms": self.duration_ms, "steps": dict(self.steps)}
+
+
+warm_up = WarmUp()
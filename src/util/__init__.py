@@ -1 +1,4 @@
-from .database_API_connection import ApplicationAPI
\ No newline at end of file
+from .database_API_connection import ApplicationAPI
+from .cache import CachedApplicationAPI, api_cache, invalidate_site
+from .site_snapshot import SiteSnapshot, SnapshotApplicationAPI
+from .api_factory import build_api
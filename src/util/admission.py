@@ -0,0 +1,235 @@
+import os
+import time
+import random
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from src.util.metrics import register, Counter, Histogram, trace_incr
+
+# Default wall-clock budget per query in seconds (0 disables it), and the part of it kept back for the final answer
+REQUEST_TIME_BUDGET = float(os.getenv('REQUEST_TIME_BUDGET', 120))
+FINAL_ANSWER_RESERVE = float(os.getenv('FINAL_ANSWER_RESERVE', 15))
+
+ADMISSION_WAIT = register(Histogram("gpt_admission_wait_seconds", "Time spent queued for an upstream slot.", ("upstream",)))
+ADMISSION_REJECTED = register(Counter("gpt_admission_rejected_total", "Upstream calls rejected by admission control.", ("upstream", "reason")))
+UPSTREAM_RETRIES = register(Counter("gpt_upstream_retries_total", "Upstream calls retried after 429 or 503.", ("upstream",)))
+
+# Wall-clock budget of the current request, as a time.monotonic() deadline
+_deadline = ContextVar("gpt_deadline", default=None)
+
+
+class Overloaded(Exception):
+    """Raised when an upstream's queue is full, or a call could not be admitted before its deadline."""
+
+    def __init__(self, upstream, reason, retry_after=1.0):
+        super().__init__(f"{upstream} is overloaded ({reason}), retry after {retry_after:g}s")
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def start_budget(seconds):
+    """Give the current request a wall-clock budget. Returns a token for end_budget; a falsy budget means no limit."""
+    return _deadline.set(time.monotonic() + float(seconds) if seconds else None)
+
+
+def end_budget(token):
+    _deadline.reset(token)
+
+
+def narrow_budget(seconds):
+    """Cut the current budget to at most seconds from now, e.g. for one tool call. Returns a token for end_budget."""
+    deadline = time.monotonic() + float(seconds)
+    current = _deadline.get()
+    return _deadline.set(deadline if current is None else min(current, deadline))
+
+
+def remaining_budget():
+    """Seconds left in the current request's budget (negative once spent), or None without a budget."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def budget_exhausted(reserve=0):
+    """True once less than reserve seconds of the current request's budget are left."""
+    remaining = remaining_budget()
+    return remaining is not None and remaining <= reserve
+
+
+def clamp_to_budget(timeout, reserve=0):
+    """The smaller of timeout and the time left in the current request's budget less reserve, never below zero."""
+    remaining = remaining_budget()
+    return timeout if remaining is None else max(0.0, min(timeout, remaining - reserve))
+
+
+class TokenBucket:
+    """Token-bucket rate limit: rate calls per second on average, with bursts of up to burst calls."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait=None):
+        """
+        Take one token, borrowing against future refills if none is available.
+
+        Returns:
+            float: Seconds to wait before the call may proceed, or None (taking nothing) if that exceeds max_wait.
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+
+class Limiter:
+    """
+    Admission control for one upstream: a concurrency cap, a bounded wait queue and a token-bucket rate limit.
+
+    Callers beyond max_concurrency queue for a slot. When max_queue callers are already waiting, new ones are rejected
+    at once with Overloaded, so a burst fails fast instead of piling up behind a saturated upstream. Queued callers
+    give up at the earlier of queue_timeout and the request's budget. A limit of 0 disables that part.
+    """
+
+    def __init__(self, name, rate=0, burst=1, max_concurrency=0, max_queue=0, queue_timeout=30, retries=2, retry_backoff=0.5,
+                 retry_statuses=(429, 503), retry_errors=()):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        # Response statuses and exception types (e.g. a client's connection errors) that are worth retrying
+        self.retry_statuses = tuple(retry_statuses)
+        self.retry_errors = tuple(retry_errors)
+        self._active = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+    def _reject(self, reason):
+        ADMISSION_REJECTED.inc(upstream=self.name, reason=reason)
+        trace_incr(f"{self.name}_rejected")
+        raise Overloaded(self.name, reason)
+
+    def _acquire(self, deadline):
+        started = time.monotonic()
+        with self._cond:
+            if self.max_concurrency and (self._active >= self.max_concurrency or self._waiting):
+                if self._waiting >= self.max_queue:
+                    self._reject("queue_full")
+                self._waiting += 1
+                try:
+                    while self._active >= self.max_concurrency:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject("deadline")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._active += 1
+
+        wait = self.bucket.reserve(max_wait=deadline - time.monotonic())
+        if wait is None:
+            self._release()
+            self._reject("rate_limited")
+        if wait:
+            time.sleep(wait)
+        ADMISSION_WAIT.observe(time.monotonic() - started, upstream=self.name)
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the upstream's slots for the duration of the block."""
+        deadline = time.monotonic() + self.queue_timeout
+        remaining = remaining_budget()
+        if remaining is not None:
+            deadline = min(deadline, time.monotonic() + remaining)
+        self._acquire(deadline)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self):
+        with self._cond:
+            return {"active": self._active, "waiting": self._waiting,
+                    "max_concurrency": self.max_concurrency, "max_queue": self.max_queue}
+
+
+def retry_after(exc, attempt, backoff, statuses=(429, 503), errors=()):
+    """
+    Seconds to wait before retrying a failed upstream call, or None if it should not be retried.
+
+    Responses with a status in statuses (429 and 503 by default) and exceptions of the types in errors are retried.
+    The upstream's Retry-After header is honoured when present, otherwise the delay backs off exponentially with jitter.
+    """
+    backoff_delay = backoff * (2 ** attempt) * (0.5 + random.random())
+    if errors and isinstance(exc, errors):
+        return backoff_delay
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if status not in statuses:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return backoff_delay
+
+
+def call_with_retries(limiter, fn, *args, **kwargs):
+    """
+    Call fn inside one of the limiter's slots, retrying the failures the limiter lists as retryable.
+
+    The slot is released while waiting to retry, and a retry that would not finish within the request's budget is
+    not attempted: the last error is raised instead.
+    """
+    for attempt in range(limiter.retries + 1):
+        with limiter.slot():
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                delay = retry_after(e, attempt, limiter.retry_backoff, limiter.retry_statuses, limiter.retry_errors)
+                if delay is None or attempt == limiter.retries or budget_exhausted(delay):
+                    raise
+        UPSTREAM_RETRIES.inc(upstream=limiter.name)
+        trace_incr(f"{limiter.name}_retries")
+        time.sleep(delay)
+
+
+def limiter_from_env(prefix, name, max_concurrency, max_queue, retry_statuses=(429, 503)):
+    """Build a Limiter whose settings can be overridden with <prefix>_RATE_LIMIT, <prefix>_MAX_CONCURRENCY and so on."""
+    return Limiter(
+        name,
+        rate=float(os.getenv(f'{prefix}_RATE_LIMIT', 0)),
+        burst=int(os.getenv(f'{prefix}_RATE_BURST', 10)),
+        max_concurrency=int(os.getenv(f'{prefix}_MAX_CONCURRENCY', max_concurrency)),
+        max_queue=int(os.getenv(f'{prefix}_MAX_QUEUE', max_queue)),
+        queue_timeout=float(os.getenv(f'{prefix}_QUEUE_TIMEOUT', 30)),
+        retries=int(os.getenv(f'{prefix}_MAX_RETRIES', 2)),
+        retry_backoff=float(os.getenv(f'{prefix}_RETRY_BACKOFF', 0.5)),
+        retry_statuses=retry_statuses,
+    )
+
+
+# One limiter per upstream, shared by every request in the process
+# The model client does not retry itself, so transient 5xx responses are retried here as well as 429 and 503.
+# The backend's 502 and 504 are already retried by its urllib3 adapter.
+model_limiter = limiter_from_env('MODEL', "model", max_concurrency=16, max_queue=64, retry_statuses=(429, 500, 502, 503, 504))
+backend_limiter = limiter_from_env('BACKEND_ADMISSION', "backend", max_concurrency=32, max_queue=256)
@@ -0,0 +1,22 @@
+import os
+
+from src.util.database_API_connection import ApplicationAPI
+from src.util.cache import CachedApplicationAPI
+from src.util.site_snapshot import SnapshotApplicationAPI
+
+API_CACHE_ENABLED = os.getenv('API_CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+SITE_SNAPSHOT_ENABLED = os.getenv('SITE_SNAPSHOT_ENABLED', '0') not in ('0', 'false', 'False')
+
+
+def build_api(site_id, **kwargs):
+    """
+    Construct the ApplicationAPI used to serve a query.
+
+    SITE_SNAPSHOT_ENABLED answers lookups from a local site snapshot, API_CACHE_ENABLED (on by default)
+    caches site-level reads, and with both off every call goes to the backend.
+    """
+    if SITE_SNAPSHOT_ENABLED:
+        return SnapshotApplicationAPI(site_id, **kwargs)
+    if API_CACHE_ENABLED:
+        return CachedApplicationAPI(site_id, **kwargs)
+    return ApplicationAPI(site_id, **kwargs)
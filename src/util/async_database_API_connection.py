@@ -0,0 +1,207 @@
+import asyncio
+import threading
+
+import httpx
+
+from src.util.database_API_connection import DEFAULT_BASE_URL, truncate_asset_severity_data, filter_reports
+from src.util.http_session import POOL_MAXSIZE, CONNECT_TIMEOUT, READ_TIMEOUT, RETRY_TOTAL
+from src.util.cache import api_cache, CachedApplicationAPI
+from src.util.api_factory import API_CACHE_ENABLED
+from src.util.metrics import span, trace_incr, endpoint_label, PAYLOAD_BYTES, CACHE_REQUESTS
+from src.util import report_aggregates
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_async_client(base_url):
+    """
+    Return the process-wide httpx.AsyncClient for a backend base URL.
+
+    The client keeps a pool of keep-alive connections shared by every AsyncApplicationAPI instance
+    and must be used from the event loop of the ASGI server that created it.
+    """
+    client = _clients.get(base_url)
+    if client is None or client.is_closed:
+        with _clients_lock:
+            client = _clients.get(base_url)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(
+                    headers={"Content-Type": "application/json"},
+                    timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                    # httpx ignores the client's limits when a transport is given, so they are set on the transport
+                    transport=httpx.AsyncHTTPTransport(
+                        retries=RETRY_TOTAL,
+                        limits=httpx.Limits(max_connections=POOL_MAXSIZE, max_keepalive_connections=POOL_MAXSIZE),
+                    ),
+                )
+                _clients[base_url] = client
+    return client
+
+
+async def close_async_clients():
+    """Close every pooled async client, e.g. on ASGI lifespan shutdown."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+class AsyncApplicationAPI:
+    """Async counterpart of ApplicationAPI with the same methods and return values, for the ASGI serving path."""
+
+    def __init__(self, site_id, base_url=DEFAULT_BASE_URL):
+        self.base_url = base_url
+        self.site_id = site_id
+        self.client = get_async_client(base_url)
+
+    async def _get(self, url):
+        with span("backend", endpoint_label(url[len(self.base_url):])) as record:
+            response = await self.client.get(url)
+            record["status"] = response.status_code
+            record["bytes"] = len(response.content)
+        trace_incr("backend_calls")
+        PAYLOAD_BYTES.observe(record["bytes"], direction="backend")
+        response.raise_for_status()
+        return response.json()
+
+    async def get_asset_ids_names(self):
+        return await self._get(f"{self.base_url}sites/{self.site_id}/assets")
+
+    async def get_all_reports_data(self):
+        return await self._get(f"{self.base_url}sites/{self.site_id}/reports")
+
+    async def get_single_report_data(self, report_id):
+        return await self._get(f"{self.base_url}sites/{self.site_id}/reports/data/{report_id}")
+
+    async def get_all_asset_names_from_system_id(self, system_ids):
+        return await self._get(f"{self.base_url}sites/{self.site_id}/reports/assetlist/{system_ids}")
+
+    async def get_system_list_for_site(self):
+        return await self._get(f"{self.base_url}sites/{self.site_id}/systems")
+
+    async def get_all_report_data_from_asset_names(self, asset_name):
+        return await self._get(f"{self.base_url}sites/{self.site_id}/reports/asset/name/{asset_name}")
+
+    async def get_all_report_data_from_asset_names_full(self, asset_name):
+        return await self._get(f"{self.base_url}sites/{self.site_id}/reports/asset/name/full/{asset_name}")
+
+    async def get_all_asset_severity_data(self):
+        return truncate_asset_severity_data(await self._get(f"{self.base_url}sites/{self.site_id}/homepage-cards"))
+
+    async def get_all_system_severity_data(self):
+        return await self._get(f"{self.base_url}sites/{self.site_id}/homepage-graph")
+
+    async def get_number_of_assets(self):
+        return await self._get(f"{self.base_url}sitepage/summary/{self.site_id}")
+
+    async def get_number_of_reports(self):
+        return await self._get(f"{self.base_url}sitepage/reports/{self.site_id}")
+
+    async def get_asset_comments(self, entityId):
+        return await self._get(f"{self.base_url}sites/{self.site_id}/asset/{entityId}/comments")
+
+    async def get_report_comments(self, entityId):
+        return await self._get(f"{self.base_url}sites/{self.site_id}/report/{entityId}/comments")
+
+    async def get_all_report_comments(self):
+        return await self._get(f"{self.base_url}sites/{self.site_id}/comments")
+
+    async def get_reports_by_severity(self, severity=None, since=None, asset_name=None):
+        return filter_reports(await self.get_all_reports_data(), severity, since, asset_name)
+
+    async def get_report_counts(self, group_by="asset", since=None, until=None, asset_name=None, period=None):
+        reports = report_aggregates.within(await self.get_reports_by_severity(None, since, asset_name), None, until)
+        return report_aggregates.count_by(reports, report_aggregates.parse_group_by(group_by), period or "month")
+
+    async def get_severity_trend(self, period=None, since=None, asset_name=None):
+        return report_aggregates.count_by(await self.get_reports_by_severity(None, since, asset_name), ("period",), period or "month")
+
+    async def get_worst_assets(self, limit=None, since=None):
+        return report_aggregates.worst_assets(await self.get_reports_by_severity(None, since), int(limit or 5))
+
+
+# Loads in progress on the event loop, so concurrent misses on the same key await one fetch
+_inflight = {}
+
+
+class CachedAsyncApplicationAPI(AsyncApplicationAPI):
+    """
+    AsyncApplicationAPI whose site-level reads are served from the shared TTL cache.
+
+    Entries use the same keys and TTLs as CachedApplicationAPI, so /cache/invalidate applies to both. Concurrent
+    misses are coalesced on the event loop rather than by blocking, since the cache's own single-flight waits on a thread.
+    """
+
+    def __init__(self, site_id, cache=None, ttls=None, **kwargs):
+        super().__init__(site_id, **kwargs)
+        self.cache = cache if cache is not None else api_cache
+        self.ttls = dict(CachedApplicationAPI.CACHE_TTLS, **(ttls or {}))
+
+    async def _cached(self, method_name, loader, *args):
+        key = (self.base_url, self.site_id, method_name, args)
+        hit, value = self.cache.get(key)
+        if hit:
+            CACHE_REQUESTS.inc(result="hit")
+            trace_incr("cache_hits")
+            return value
+
+        task = _inflight.get(key)
+        if task is None:
+            CACHE_REQUESTS.inc(result="miss")
+            trace_incr("cache_misses")
+            task = _inflight[key] = asyncio.ensure_future(loader(*args))
+            ttl = self.ttls.get(method_name)
+
+            def store(task):
+                _inflight.pop(key, None)
+                if not task.cancelled() and task.exception() is None:
+                    self.cache.set(key, task.result(), ttl)
+
+            task.add_done_callback(store)
+        else:
+            CACHE_REQUESTS.inc(result="coalesced")
+            trace_incr("cache_coalesced")
+        # A caller that times out must not cancel the fetch other callers are waiting on
+        return await asyncio.shield(task)
+
+    async def get_asset_ids_names(self):
+        return await self._cached("get_asset_ids_names", super().get_asset_ids_names)
+
+    async def get_system_list_for_site(self):
+        return await self._cached("get_system_list_for_site", super().get_system_list_for_site)
+
+    async def get_number_of_assets(self):
+        return await self._cached("get_number_of_assets", super().get_number_of_assets)
+
+    async def get_number_of_reports(self):
+        return await self._cached("get_number_of_reports", super().get_number_of_reports)
+
+    async def get_all_reports_data(self):
+        return await self._cached("get_all_reports_data", super().get_all_reports_data)
+
+    async def get_all_system_severity_data(self):
+        return await self._cached("get_all_system_severity_data", super().get_all_system_severity_data)
+
+    async def get_all_asset_severity_data(self):
+        return await self._cached("get_all_asset_severity_data", super().get_all_asset_severity_data)
+
+    async def get_all_report_comments(self):
+        return await self._cached("get_all_report_comments", super().get_all_report_comments)
+
+    async def get_all_report_data_from_asset_names(self, asset_name):
+        return await self._cached("get_all_report_data_from_asset_names", super().get_all_report_data_from_asset_names, asset_name)
+
+    async def get_all_report_data_from_asset_names_full(self, asset_name):
+        return await self._cached("get_all_report_data_from_asset_names_full", super().get_all_report_data_from_asset_names_full, asset_name)
+
+    async def get_single_report_data(self, report_id):
+        return await self._cached("get_single_report_data", super().get_single_report_data, str(report_id))
+
+
+def build_async_api(site_id, **kwargs):
+    """Async counterpart of build_api: the cached API unless API_CACHE_ENABLED is off. There is no async site snapshot."""
+    if API_CACHE_ENABLED:
+        return CachedAsyncApplicationAPI(site_id, **kwargs)
+    return AsyncApplicationAPI(site_id, **kwargs)
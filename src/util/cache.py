@@ -0,0 +1,234 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from src.util.database_API_connection import ApplicationAPI
+from src.util.metrics import CACHE_REQUESTS, trace_incr
+
+API_CACHE_MAXSIZE = int(os.getenv('API_CACHE_MAXSIZE', 2048))
+
+
+class _Flight:
+    """A fetch in progress. Concurrent misses on the same key wait on it instead of fetching again."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.stale = False
+
+
+class TTLCache:
+    """
+    Thread-safe cache with per-entry TTLs, bounded LRU eviction and single-flight loading.
+
+    Values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, maxsize=API_CACHE_MAXSIZE, default_ttl=60):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return (True, value) for a fresh entry, otherwise (False, None)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+        return False, None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def _store(self, key, value, ttl):
+        # Caller holds the lock
+        self._data[key] = (time.monotonic() + (ttl if ttl is not None else self.default_ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_load(self, key, loader, ttl=None):
+        """
+        Return the cached value for key, calling loader() on a miss.
+
+        Only one loader runs per key at a time; other threads missing on the same key wait for its result.
+
+        Args:
+            key (tuple): The cache key.
+            loader (callable): Fetches the value on a miss.
+            ttl (float): Seconds the loaded value stays fresh. Defaults to the cache default.
+
+        Returns:
+            The cached or freshly loaded value.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    CACHE_REQUESTS.inc(result="hit")
+                    trace_incr("cache_hits")
+                    return entry[1]
+                del self._data[key]
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        CACHE_REQUESTS.inc(result="miss" if leader else "coalesced")
+        trace_incr("cache_misses" if leader else "cache_coalesced")
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            raise
+        else:
+            with self._lock:
+                # Results fetched across an invalidation may already be out of date, so are not stored
+                if not flight.stale:
+                    self._store(key, flight.value, ttl)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+        return flight.value
+
+    def invalidate(self, predicate=None):
+        """
+        Drop every entry whose key matches predicate (all entries when predicate is None).
+
+        Returns:
+            int: The number of entries removed.
+        """
+        with self._lock:
+            keys = [key for key in self._data if predicate is None or predicate(key)]
+            for key in keys:
+                del self._data[key]
+            for key, flight in self._inflight.items():
+                if predicate is None or predicate(key):
+                    flight.stale = True
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Process-wide cache shared by every CachedApplicationAPI instance
+api_cache = TTLCache()
+
+
+class CachedApplicationAPI(ApplicationAPI):
+    """ApplicationAPI whose site-level reads are served from the shared TTL cache. Keys are (base_url, site_id, method, args)."""
+
+    # Seconds each endpoint's data stays fresh
+    CACHE_TTLS = {
+        "get_asset_ids_names": 300,
+        "get_system_list_for_site": 600,
+        "get_number_of_assets": 300,
+        "get_number_of_reports": 30,
+        "get_all_reports_data": 120,
+        "get_all_system_severity_data": 120,
+        "get_all_asset_severity_data": 120,
+        "get_all_report_comments": 60,
+        "get_all_report_data_from_asset_names": 120,
+        "get_all_report_data_from_asset_names_full": 120,
+        "get_single_report_data": 600,
+    }
+
+    def __init__(self, site_id, cache=None, ttls=None, **kwargs):
+        super().__init__(site_id, **kwargs)
+        self.cache = cache if cache is not None else api_cache
+        self.ttls = dict(self.CACHE_TTLS, **(ttls or {}))
+
+    def _cached(self, method_name, loader, *args):
+        key = (self.base_url, self.site_id, method_name, args)
+        return self.cache.get_or_load(key, lambda: loader(*args), self.ttls.get(method_name))
+
+    def get_asset_ids_names(self):
+        return self._cached("get_asset_ids_names", super().get_asset_ids_names)
+
+    def get_system_list_for_site(self):
+        return self._cached("get_system_list_for_site", super().get_system_list_for_site)
+
+    def get_number_of_assets(self):
+        return self._cached("get_number_of_assets", super().get_number_of_assets)
+
+    def get_number_of_reports(self):
+        return self._cached("get_number_of_reports", super().get_number_of_reports)
+
+    def get_all_reports_data(self):
+        return self._cached("get_all_reports_data", super().get_all_reports_data)
+
+    def get_all_system_severity_data(self):
+        return self._cached("get_all_system_severity_data", super().get_all_system_severity_data)
+
+    def get_all_asset_severity_data(self):
+        return self._cached("get_all_asset_severity_data", super().get_all_asset_severity_data)
+
+    def get_all_report_comments(self):
+        return self._cached("get_all_report_comments", super().get_all_report_comments)
+
+    def get_all_report_data_from_asset_names(self, asset_name):
+        return self._cached("get_all_report_data_from_asset_names", super().get_all_report_data_from_asset_names, asset_name)
+
+    def get_all_report_data_from_asset_names_full(self, asset_name):
+        return self._cached("get_all_report_data_from_asset_names_full", super().get_all_report_data_from_asset_names_full, asset_name)
+
+    def get_single_report_data(self, report_id):
+        # Report IDs arrive as strings from the model and ints from other results; normalise so both share an entry
+        return self._cached("get_single_report_data", super().get_single_report_data, str(report_id))
+
+
+def invalidate_site(site_id, base_url=None):
+    """
+    Invalidation hook for when a site's data changes, e.g. after a new report is uploaded.
+
+    Args:
+        site_id: The site whose cached reads should be dropped.
+        base_url (str): Restrict to one backend. Defaults to every backend.
+
+    Returns:
+        int: The number of entries removed.
+    """
+    site_id = str(site_id)
+    return api_cache.invalidate(
+        lambda key: str(key[1]) == site_id and (base_url is None or key[0] == base_url)
+    )
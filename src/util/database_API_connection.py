@@ -1,20 +1,112 @@
-import requests
-import json
+import os
+
+from src.util.http_session import get_session, DEFAULT_TIMEOUT
+from src.util.metrics import span, trace_incr, endpoint_label, PAYLOAD_BYTES
+from src.util.admission import backend_limiter, call_with_retries, clamp_to_budget
+from src.util import report_aggregates
+from src.util.incremental import get_collection, load_json_stream, decode_chunks, INCREMENTAL_SYNC_ENABLED, STREAM_CHUNK_SIZE
+
+DEFAULT_BASE_URL = os.getenv('BACKEND_BASE_URL', "http://127.0.0.1:3050/api/v1/")
+
+def truncate_asset_severity_data(response_data, limit=10):
+    """Keep the first rows of the homepage-cards payload. Truncation is structural so the result is always valid JSON."""
+    if isinstance(response_data, list):
+        return response_data[:limit]
+    if isinstance(response_data, dict):
+        return {key: value[:limit] if isinstance(value, list) else value for key, value in response_data.items()}
+    return response_data
+
+
+def filter_reports(reports, severity=None, since=None, asset_name=None):
+    """Filter report rows from get_all_reports_data by severity level, earliest date (YYYY-MM-DD) and asset name."""
+    matches = []
+    for report in reports:
+        if severity is not None and (report.get('severity') or {}).get('severity') != int(severity):
+            continue
+        if since and (report.get('date') or '') < since:
+            continue
+        if asset_name and (report.get('asset') or {}).get('name') != asset_name:
+            continue
+        matches.append(report)
+    return matches
+
 
 class ApplicationAPI:
-    def __init__(self, site_id, base_url="http://127.0.0.1:3050/api/v1/"):
+    def __init__(self, site_id, base_url=DEFAULT_BASE_URL, timeout=DEFAULT_TIMEOUT):
         """There are multiple sites, but with each call we will only focus on one site. The database is made up of reports, these reports pertain to a specific system in a specific asset. These reports have all the data and information required to diagnose problems. Each data point in these reports has a severity; 0 = no warning, 1 = early warning, 2 = advanced warning. These severites cascade to the asset level. """
         self.base_url = base_url
         self.site_id = site_id
         self.headers = {"Content-Type": "application/json"}
+        self.timeout = timeout
+        self.session = get_session(base_url)
+
+    def _request_timeout(self, timeout=None):
+        """(connect, read) timeout for one request, cut to what is left of the current budget. Raises TimeoutError once it is spent."""
+        timeout = timeout or self.timeout
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        read = clamp_to_budget(read)
+        if read <= 0:
+            raise TimeoutError("The time budget for this call is spent")
+        return min(connect, read), read
+
+    def _get(self, url, timeout=None):
+        """GET a backend URL over the shared pooled session and decode the JSON body. Raises on HTTP errors and timeouts."""
+        # Admission control caps concurrent backend calls and retries 429/503 responses
+        return call_with_retries(backend_limiter, self._fetch, url, timeout)
+
+    def _fetch(self, url, timeout=None):
+        with span("backend", endpoint_label(url[len(self.base_url):])) as record:
+            response = self.session.get(url, headers=self.headers, timeout=self._request_timeout(timeout))
+            record["status"] = response.status_code
+            record["bytes"] = len(response.content)
+        trace_incr("backend_calls")
+        PAYLOAD_BYTES.observe(record["bytes"], direction="backend")
+        response.raise_for_status()
+        return response.json()
+
+    def _get_collection(self, url):
+        """
+        GET a large collection endpoint through its locally held copy, so a refresh only transfers what changed.
+
+        The response is decoded as it streams in. See SyncedCollection for how refreshes are chosen.
+        """
+        if not INCREMENTAL_SYNC_ENABLED:
+            return self._get(url)
+        return call_with_retries(backend_limiter, self._sync_collection, url, get_collection(url))
+
+    def _sync_collection(self, url, collection):
+        with collection.lock:
+            headers, params, incremental = collection.request_args()
+            with span("backend", endpoint_label(url[len(self.base_url):]), incremental=incremental) as record:
+                response = self.session.get(url, headers=dict(self.headers, **headers), params=params,
+                                            timeout=self._request_timeout(), stream=True)
+                record["status"] = response.status_code
+                record["bytes"] = 0
+                try:
+                    if response.status_code == 304 and collection.rows is not None:
+                        result = collection.not_modified()
+                    else:
+                        response.raise_for_status()
+
+                        def byte_chunks():
+                            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                                record["bytes"] += len(chunk)
+                                yield chunk
+
+                        data = load_json_stream(decode_chunks(byte_chunks(), response.encoding))
+                        result = collection.apply(data, response.headers, incremental)
+                finally:
+                    response.close()
+        trace_incr("backend_calls")
+        PAYLOAD_BYTES.observe(record["bytes"], direction="backend")
+        return result
 
     def get_asset_ids_names(self):
         """Provides the Asset Id, Name and Location. Example:
         {'id': 1, 'name': 'F1', 'location': 'Robin Rigg F01'}
         """
         url = f"{self.base_url}sites/{self.site_id}/assets"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self._get(url)
 
     def get_all_reports_data(self):
         """Provides all reports in the system. Example: {'id': 1,
@@ -24,8 +116,7 @@ class ApplicationAPI:
           'systems': {'system_id': 1, 'name': 'Hydraulic Pitch Station'},
           'severity': {'sev_id': 1, 'severity': 2, 'severity_count': 3}},"""
         url = f"{self.base_url}sites/{self.site_id}/reports"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self._get_collection(url)
 
     def get_single_report_data(self, report_id):
         """Get summary data for a single report. Need report ID. Example: {'id': 1,
@@ -42,21 +133,18 @@ class ApplicationAPI:
            'latidute': None,
            'longitude': None}}. """
         url = f"{self.base_url}sites/{self.site_id}/reports/data/{report_id}"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self._get(url)
         
     def get_all_asset_names_from_system_id(self, system_ids):
         """Get all Asset names and ids for a given system. Need a system ID {'name': 'F1', 'asset_id': 1}"""
         url = f"{self.base_url}sites/{self.site_id}/reports/assetlist/{system_ids}"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self._get(url)
 
     def get_system_list_for_site(self):
         """All possible systems in a site. Example: 
         {'system_id': 1, 'name': 'Hydraulic Pitch Station'}"""
         url = f"{self.base_url}sites/{self.site_id}/systems"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self._get(url)
 
     def get_all_report_data_from_asset_names(self, asset_name):
         """All report data on specific asset. Example: 
@@ -68,8 +156,7 @@ class ApplicationAPI:
           'severity': {'sev_id': 1, 'severity': 2, 'severity_count': 3},
           'site': {'site_id': 1}}, """
         url = f"{self.base_url}sites/{self.site_id}/reports/asset/name/{asset_name}"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self._get(url)
 
     def get_all_report_data_from_asset_names_full(self, asset_name):
         """All report data on specific asset. Example: 
@@ -81,64 +168,57 @@ class ApplicationAPI:
           'severity': {'sev_id': 1, 'severity': 2, 'severity_count': 3},
           'site': {'site_id': 1}}, """
         url = f"{self.base_url}sites/{self.site_id}/reports/asset/name/full/{asset_name}"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self._get(url)
 
     def get_all_asset_severity_data(self):
-        """Fetch and truncate the data about assets sorted by severities to ensure the output does not exceed JSON format constraints."""
+        """Fetch the data about assets sorted by severities, keeping only the most severe entries."""
         url = f"{self.base_url}sites/{self.site_id}/homepage-cards"
-        response = requests.get(url, headers=self.headers)
-        response_data = response.json()
-    
-        # Implementing a simple truncation of data at the top level if it's a list
-        # Adjust the logic here depending on the actual structure of your response
-        if isinstance(response_data, list) and len(response_data) > 10:  # Example limit to first 10 items
-            response_data = response_data[:10]
-        elif isinstance(response_data, dict):
-            for key in response_data:
-                if isinstance(response_data[key], list) and len(response_data[key]) > 10:
-                    response_data[key] = response_data[key][:10]
-    
-        # Convert to JSON string
-        json_string = json.dumps(response_data)
-    
-        # If you still need to cut the JSON string to a certain length
-        truncated_json_string = json_string[:5000]  # ensure it's less than 5000 characters
-    
-        return truncated_json_string
+        return truncate_asset_severity_data(self._get(url))
 
     def get_all_system_severity_data(self):
         """Total Severities by all Systems. Example: {'systems': 'Blade Bearing A', 'severity2': 58}"""
         url = f"{self.base_url}sites/{self.site_id}/homepage-graph"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self._get(url)
 
     def get_number_of_assets(self):
         """Number of Assets in the site. Example: {'2': 58}"""
         url = f"{self.base_url}sitepage/summary/{self.site_id}"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self._get(url)
 
     def get_number_of_reports(self):
         """Number of Reports at the site. Example: 1515"""
         url = f"{self.base_url}sitepage/reports/{self.site_id}"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self._get(url)
 
     def get_asset_comments(self, entityId):
         """Return all the comments made against an Asset."""
         url = f"{self.base_url}sites/{self.site_id}/asset/{entityId}/comments"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self._get(url)
 
     def get_report_comments(self, entityId):
         """Return all the comments made against a report"""
         url = f"{self.base_url}sites/{self.site_id}/report/{entityId}/comments"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self._get(url)
 
     def get_all_report_comments(self):
         """Get all comments for reports in a site."""
         url = f"{self.base_url}sites/{self.site_id}/comments"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self._get_collection(url)
+
+    def get_reports_by_severity(self, severity=None, since=None, asset_name=None):
+        """Reports filtered by severity level, date and asset. The backend has no such endpoint, so this filters get_all_reports_data locally."""
+        return filter_reports(self.get_all_reports_data(), severity, since, asset_name)
+
+    def get_report_counts(self, group_by="asset", since=None, until=None, asset_name=None, period=None):
+        """Report counts and severity distribution grouped by asset, system and/or period, computed locally from the report list."""
+        reports = report_aggregates.within(self.get_reports_by_severity(None, since, asset_name), None, until)
+        return report_aggregates.count_by(reports, report_aggregates.parse_group_by(group_by), period or "month")
+
+    def get_severity_trend(self, period=None, since=None, asset_name=None):
+        """Report counts per severity level for each day, week, month or year, oldest first."""
+        reports = self.get_reports_by_severity(None, since, asset_name)
+        return report_aggregates.count_by(reports, ("period",), period or "month")
+
+    def get_worst_assets(self, limit=None, since=None):
+        """Assets ranked by how many of their systems are currently at advanced, then early, warning."""
+        return report_aggregates.worst_assets(self.get_reports_by_severity(None, since), int(limit or 5))
@@ -0,0 +1,72 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Transport settings, overridable through the environment so each deployment can size the pool to its worker count.
+POOL_CONNECTIONS = int(os.getenv('BACKEND_POOL_CONNECTIONS', 10))
+POOL_MAXSIZE = int(os.getenv('BACKEND_POOL_MAXSIZE', 32))
+CONNECT_TIMEOUT = float(os.getenv('BACKEND_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.getenv('BACKEND_READ_TIMEOUT', 30))
+RETRY_TOTAL = int(os.getenv('BACKEND_RETRY_TOTAL', 3))
+RETRY_BACKOFF = float(os.getenv('BACKEND_RETRY_BACKOFF', 0.3))
+
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _build_session():
+    """Create a keep-alive session with a bounded connection pool and retry-with-backoff on idempotent reads."""
+    # 503 is left to admission control (call_with_retries), which honours Retry-After, so only one layer retries it.
+    # Read timeouts are not retried: the caller has given up by then, and a retry would only hold the worker longer.
+    retry = Retry(
+        total=RETRY_TOTAL,
+        connect=RETRY_TOTAL,
+        read=0,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=(502, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Content-Type": "application/json", "Connection": "keep-alive"})
+    return session
+
+
+def get_session(base_url):
+    """
+    Return the process-wide session for a backend base URL.
+
+    Sessions are created once per base URL and shared by every ApplicationAPI instance and Flask worker thread,
+    so connections to the backend are reused instead of being opened on each tool call.
+
+    Args:
+        base_url (str): The backend base URL the session will be used against.
+
+    Returns:
+        requests.Session: The shared, pooled session.
+    """
+    session = _sessions.get(base_url)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(base_url)
+            if session is None:
+                session = _build_session()
+                _sessions[base_url] = session
+    return session
+
+
+def close_sessions():
+    """Close every pooled session, e.g. on shutdown or after forking worker processes."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
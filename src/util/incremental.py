@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import codecs
+import threading
+from collections import OrderedDict
+
+from src.util.metrics import register, Counter
+
+INCREMENTAL_SYNC_ENABLED = os.getenv('INCREMENTAL_SYNC_ENABLED', '1') not in ('0', 'false', 'False')
+# Query parameter asking the backend for rows with an id above the watermark. A backend that ignores it simply
+# returns the whole collection, which is then treated as a full refresh, so it is safe to send either way.
+WATERMARK_PARAM = os.getenv('BACKEND_WATERMARK_PARAM', 'afterId')
+# Incremental refreshes never see edited or deleted rows, so the whole collection is fetched again this often
+FULL_SYNC_INTERVAL = float(os.getenv('INCREMENTAL_FULL_SYNC_INTERVAL', 60 * 60))
+STREAM_CHUNK_SIZE = int(os.getenv('BACKEND_STREAM_CHUNK_SIZE', 64 * 1024))
+
+COLLECTION_SYNCS = register(Counter("gpt_collection_syncs_total", "Backend collection refreshes by outcome.", ("result",)))
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+def decode_chunks(byte_chunks, encoding=None):
+    """Decode an iterable of byte chunks to text, handling multi-byte characters split across chunks."""
+    decoder = codecs.getincrementaldecoder(encoding or "utf-8")()
+    for chunk in byte_chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def _iter_array(buffer, chunks):
+    # buffer starts just after the opening bracket; elements are decoded as soon as they are complete
+    pos = 0
+    while True:
+        while pos < len(buffer) and (buffer[pos] in _WHITESPACE or buffer[pos] == ","):
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        item, end = None, None
+        if pos < len(buffer):
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except ValueError:
+                end = None
+            # A number or literal is only complete once a terminator follows it: "1." or "1e" at the end of a
+            # chunk decodes as 1, but continues in the next chunk
+            if end is not None and not isinstance(item, (dict, list, str)):
+                if end == len(buffer) or buffer[end] not in _WHITESPACE + ",]":
+                    end = None
+        if end is not None:
+            yield item
+            pos = end
+            continue
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError("Truncated JSON array")
+        buffer, pos = buffer[pos:] + chunk, 0
+
+
+def load_json_stream(chunks):
+    """
+    Decode a JSON document from an iterable of text chunks.
+
+    A top-level array is decoded one element at a time as the chunks arrive, so the full response text is never
+    held in memory alongside the decoded rows. Any other document is decoded in one go.
+    """
+    chunks = iter(chunks)
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        if buffer.strip(_WHITESPACE):
+            break
+    stripped = buffer.lstrip(_WHITESPACE)
+    if not stripped.startswith("["):
+        return json.loads(stripped + "".join(chunks))
+    return list(_iter_array(stripped[1:], chunks))
+
+
+class SyncedCollection:
+    """
+    Locally held copy of one backend collection (a list of rows with ids), kept current with cheap refreshes.
+
+    A refresh first tries the cheapest request the backend can answer: rows past the id watermark when a copy is
+    held, or a conditional request (If-None-Match / If-Modified-Since) for the whole collection. New rows are merged
+    into the held copy. The whole collection is fetched again every FULL_SYNC_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self.rows = None  # id -> row, in the order the backend returned them
+        self.etag = None
+        self.last_modified = None
+        self.watermark = None
+        self.full_synced_at = 0.0
+        self.lock = threading.Lock()
+
+    def request_args(self):
+        """
+        Returns:
+            tuple: (headers, params, incremental) for the next refresh; incremental is True when only rows past
+                   the watermark are asked for.
+        """
+        if self.rows is None:
+            return {}, {}, False
+        if WATERMARK_PARAM and self.watermark is not None and time.monotonic() - self.full_synced_at < FULL_SYNC_INTERVAL:
+            return {}, {WATERMARK_PARAM: self.watermark}, True
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers, {}, False
+
+    def not_modified(self):
+        """The held rows, after the backend answered 304 Not Modified."""
+        COLLECTION_SYNCS.inc(result="not_modified")
+        self.full_synced_at = time.monotonic()
+        return list(self.rows.values())
+
+    def apply(self, data, headers, incremental):
+        """
+        Merge a refresh response into the held copy and return the whole collection.
+
+        Responses that are not lists of rows with ids are returned as they are and not held.
+        """
+        if not isinstance(data, list) or not all(isinstance(row, dict) and row.get('id') is not None for row in data):
+            self.rows = None
+            COLLECTION_SYNCS.inc(result="unmergeable")
+            return data
+
+        # A backend that ignored the watermark sends rows we already hold, so treat that as a full refresh
+        if incremental and all(row['id'] > self.watermark for row in data):
+            for row in data:
+                self.rows[row['id']] = row
+            COLLECTION_SYNCS.inc(result="incremental")
+        else:
+            self.rows = OrderedDict((row['id'], row) for row in data)
+            self.etag = headers.get("ETag")
+            self.last_modified = headers.get("Last-Modified")
+            self.full_synced_at = time.monotonic()
+            COLLECTION_SYNCS.inc(result="full")
+
+        self.watermark = max(self.rows, default=self.watermark)
+        return list(self.rows.values())
+
+
+_collections = {}
+_collections_lock = threading.Lock()
+
+
+def get_collection(url):
+    """The process-wide SyncedCollection for a collection URL, shared by every ApplicationAPI instance."""
+    with _collections_lock:
+        collection = _collections.get(url)
+        if collection is None:
+            collection = _collections[url] = SyncedCollection()
+        return collection
+
+
+def drop_collections(site_id=None, base_url=None):
+    """
+    Forget held collections, so the next read of each one is a full fetch.
+
+    Args:
+        site_id: Only drop this site's collections. Defaults to every site.
+        base_url (str): Restrict to one backend. Defaults to every backend.
+
+    Returns:
+        int: The number of collections dropped.
+    """
+    with _collections_lock:
+        urls = [
+            url for url in _collections
+            if (site_id is None or f"/sites/{site_id}/" in url) and (base_url is None or url.startswith(base_url))
+        ]
+        for url in urls:
+            del _collections[url]
+        return len(urls)
@@ -0,0 +1,200 @@
+import re
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import Counter as _Counter
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram with optional labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for i, bound in enumerate(self.buckets):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': bound})} {state[i]}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': '+Inf'})} {state[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+_registry = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+SPAN_SECONDS = register(Histogram("gpt_span_duration_seconds", "Time spent per span kind and name.", ("kind", "name")))
+MODEL_TOKENS = register(Counter("gpt_model_tokens_total", "Tokens reported by model responses.", ("type",)))
+CACHE_REQUESTS = register(Counter("gpt_api_cache_requests_total", "Backend read cache lookups by result.", ("result",)))
+PAYLOAD_BYTES = register(Histogram("gpt_payload_bytes", "Payload sizes by direction.", ("direction",), SIZE_BUCKETS))
+QUERY_DEPTH = register(Histogram("gpt_query_depth", "Tool loop depth reached per query.", (), (0, 1, 2, 3, 4, 5, 7, 10)))
+HTTP_REQUESTS = register(Counter("gpt_http_requests_total", "HTTP requests served by endpoint and status.", ("endpoint", "status")))
+
+
+class Trace:
+    """Timing breakdown for one query: spans per model turn, tool call and backend request, plus counters."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+        self.counters = _Counter()
+        self._lock = threading.Lock()
+
+    def add_span(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def summary(self):
+        with self._lock:
+            totals = {}
+            for record in self.spans:
+                totals[record["kind"]] = round(totals.get(record["kind"], 0.0) + record["duration_ms"], 1)
+            return {
+                "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+                "by_kind_ms": totals,
+                "counters": dict(self.counters),
+                "spans": list(self.spans),
+            }
+
+
+_current_trace = ContextVar("gpt_trace", default=None)
+
+
+def start_trace():
+    """Begin a trace for the current request. Returns (trace, token); pass the token to end_trace."""
+    trace = Trace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def trace_incr(name, amount=1):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.incr(name, amount)
+
+
+@contextmanager
+def span(kind, name, **attrs):
+    """
+    Time a block as a span of the given kind (model, tool, backend, serialize).
+
+    The duration is always recorded in gpt_span_duration_seconds, and in the current trace when one is active.
+    The yielded dict can be filled with extra attributes, such as token counts or sizes, inside the block.
+    Setting record["discard"] drops the span, for blocks that turn out to only start work timed elsewhere.
+    """
+    record = {"kind": kind, "name": name}
+    record.update(attrs)
+    started = time.perf_counter()
+    trace = _current_trace.get()
+    try:
+        yield record
+    finally:
+        duration = time.perf_counter() - started
+        # No return in this finally block: it would swallow an exception raised inside the span
+        if not record.pop("discard", False):
+            SPAN_SECONDS.observe(duration, kind=kind, name=name)
+            if trace is not None:
+                record["start_ms"] = round((started - trace.started) * 1000, 1)
+                record["duration_ms"] = round(duration * 1000, 1)
+                trace.add_span(record)
+
+
+def record_usage(record, response):
+    """Copy token usage from a chat completion onto a span record and the token counters."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    record["prompt_tokens"] = usage.prompt_tokens
+    record["completion_tokens"] = usage.completion_tokens
+    MODEL_TOKENS.inc(usage.prompt_tokens, type="prompt")
+    MODEL_TOKENS.inc(usage.completion_tokens, type="completion")
+    trace_incr("prompt_tokens", usage.prompt_tokens)
+    trace_incr("completion_tokens", usage.completion_tokens)
+
+
+def endpoint_label(path):
+    """Collapse IDs and asset names in a backend path so it can be used as a low-cardinality label."""
+    path = re.sub(r"/name/(full/)?[^/]+$", r"/name/\1{name}", path)
+    return re.sub(r"/\d+(?=/|$)", "/{id}", path)
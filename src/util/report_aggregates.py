@@ -0,0 +1,118 @@
+import datetime
+from collections import defaultdict
+
+SEVERITY_COLUMNS = ("no_warning", "early_warning", "advanced_warning")
+GROUP_COLUMNS = ("asset", "system", "period")
+PERIODS = ("day", "week", "month", "year")
+
+
+def _severity(report):
+    return (report.get('severity') or {}).get('severity') or 0
+
+
+def period_key(date, period="month"):
+    """Bucket a YYYY-MM-DD date into a day, ISO week (2024-W03), month (2024-01) or year."""
+    date = (date or '')[:10]
+    if not date:
+        return None
+    if period == "day":
+        return date
+    if period == "week":
+        try:
+            year, week, _ = datetime.date.fromisoformat(date).isocalendar()
+        except ValueError:
+            return None
+        return f"{year}-W{week:02d}"
+    if period == "year":
+        return date[:4]
+    return date[:7]
+
+
+def _group_value(report, column, period):
+    if column == "asset":
+        return (report.get('asset') or {}).get('name')
+    if column == "system":
+        return (report.get('systems') or {}).get('name')
+    return period_key(report.get('date'), period)
+
+
+def parse_group_by(group_by):
+    """Turn "asset,system" or ["asset", "system"] into a tuple of known group columns. Raises ValueError on unknown ones."""
+    if isinstance(group_by, str):
+        group_by = [column.strip() for column in group_by.split(",") if column.strip()]
+    columns = tuple(group_by or ("asset",))
+    unknown = [column for column in columns if column not in GROUP_COLUMNS]
+    if unknown:
+        raise ValueError(f"Cannot group by {', '.join(unknown)}; use any of {', '.join(GROUP_COLUMNS)}.")
+    return columns
+
+
+def within(reports, since=None, until=None):
+    """Reports dated on or after since and on or before until (both YYYY-MM-DD, inclusive)."""
+    return [
+        report for report in reports
+        if (not since or (report.get('date') or '') >= since) and (not until or (report.get('date') or '')[:10] <= until)
+    ]
+
+
+def count_by(reports, group_by=("asset",), period="month"):
+    """
+    Count reports and their severity distribution per group.
+
+    Args:
+        reports (list): Report rows as returned by get_all_reports_data.
+        group_by (tuple): Any of "asset", "system" and "period".
+        period (str): Bucket size for the "period" column: day, week, month or year.
+
+    Returns:
+        list: One row per group with the group columns, "reports" and a count per severity level, ordered by group.
+    """
+    period = period if period in PERIODS else "month"
+    groups = defaultdict(lambda: [0, 0, 0, 0])
+    for report in reports:
+        counts = groups[tuple(_group_value(report, column, period) for column in group_by)]
+        counts[0] += 1
+        counts[1 + min(max(_severity(report), 0), 2)] += 1
+
+    rows = []
+    for key in sorted(groups, key=lambda key: tuple(str(value) if value is not None else "" for value in key)):
+        counts = groups[key]
+        row = dict(zip(group_by, key))
+        row["reports"] = counts[0]
+        row.update(zip(SEVERITY_COLUMNS, counts[1:]))
+        rows.append(row)
+    return rows
+
+
+def latest_per_system(reports):
+    """The most recent report for each (asset, system) pair: the current state of every system on every asset."""
+    latest = {}
+    for report in reports:
+        key = ((report.get('asset') or {}).get('name'), (report.get('systems') or {}).get('system_id'))
+        current = latest.get(key)
+        if current is None or (report.get('date') or '', report.get('id') or 0) > (current.get('date') or '', current.get('id') or 0):
+            latest[key] = report
+    return list(latest.values())
+
+
+def worst_assets(reports, limit=5):
+    """
+    Rank assets by the current severity of their systems, judged from each system's latest report.
+
+    Returns:
+        list: At most limit rows of asset, advanced_systems, early_systems, systems, warnings (the summed
+              severity_count of the latest reports) and latest_date, worst first.
+    """
+    assets = {}
+    for report in latest_per_system(reports):
+        name = (report.get('asset') or {}).get('name')
+        row = assets.setdefault(name, {"asset": name, "advanced_systems": 0, "early_systems": 0, "systems": 0, "warnings": 0, "latest_date": None})
+        severity = _severity(report)
+        row["advanced_systems"] += severity >= 2
+        row["early_systems"] += severity == 1
+        row["systems"] += 1
+        row["warnings"] += (report.get('severity') or {}).get('severity_count') or 0
+        row["latest_date"] = max(row["latest_date"] or '', report.get('date') or '') or None
+
+    ranked = sorted(assets.values(), key=lambda row: (row["advanced_systems"], row["early_systems"], row["warnings"]), reverse=True)
+    return ranked[:limit]
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from src.util.cache import CachedApplicationAPI, invalidate_site
+from src.util.incremental import drop_collections
+
+SNAPSHOT_MAX_AGE = float(os.getenv('SNAPSHOT_MAX_AGE', 300))
+
+_SCHEMA = """
+CREATE TABLE assets (id INTEGER PRIMARY KEY, name TEXT, data TEXT NOT NULL);
+CREATE TABLE systems (system_id INTEGER PRIMARY KEY, name TEXT, data TEXT NOT NULL);
+CREATE TABLE reports (
+    id INTEGER PRIMARY KEY,
+    date TEXT,
+    asset_id INTEGER,
+    asset_name TEXT,
+    system_id INTEGER,
+    severity INTEGER,
+    data TEXT NOT NULL
+);
+CREATE TABLE report_details (id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE INDEX reports_asset_name ON reports (asset_name, system_id, date);
+CREATE INDEX reports_system_id ON reports (system_id, asset_id);
+CREATE INDEX reports_severity_date ON reports (severity, date);
+CREATE INDEX reports_date ON reports (date);
+"""
+
+
+class SiteSnapshot:
+    """
+    Local, indexed copy of one site's assets, systems and reports, held in an in-memory SQLite database.
+
+    Loaded in bulk from get_all_reports_data, get_asset_ids_names and get_system_list_for_site, and refreshed
+    incrementally: only reports with IDs above the current watermark are inserted. Full report details are not
+    part of the bulk data, so they are kept here the first time each one is fetched.
+    """
+
+    def __init__(self, base_url, site_id):
+        self.base_url = base_url
+        self.site_id = site_id
+        self.loaded_at = None
+        self.report_count = None
+        self.max_report_id = 0
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def is_loaded(self):
+        return self.loaded_at is not None
+
+    def load(self, api, full=True):
+        """
+        Replace assets and systems, then either replace every report (full) or merge in only reports with an id
+        above the watermark. Only a full load removes deleted reports and picks up edited ones.
+        """
+        reports = api.get_all_reports_data()
+        assets = api.get_asset_ids_names()
+        systems = api.get_system_list_for_site()
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM assets")
+            self._conn.executemany(
+                "INSERT INTO assets (id, name, data) VALUES (?, ?, ?)",
+                [(asset.get('id'), asset.get('name'), json.dumps(asset)) for asset in assets],
+            )
+            self._conn.execute("DELETE FROM systems")
+            self._conn.executemany(
+                "INSERT INTO systems (system_id, name, data) VALUES (?, ?, ?)",
+                [(system.get('system_id'), system.get('name'), json.dumps(system)) for system in systems],
+            )
+            if full:
+                # Cached report details may describe edited or deleted reports, so they go too
+                self._conn.execute("DELETE FROM reports")
+                self._conn.execute("DELETE FROM report_details")
+                self.max_report_id = 0
+            new_reports = [report for report in reports if report.get('id', 0) > self.max_report_id]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO reports (id, date, asset_id, asset_name, system_id, severity, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        report.get('id'),
+                        report.get('date'),
+                        (report.get('asset') or {}).get('id'),
+                        (report.get('asset') or {}).get('name'),
+                        (report.get('systems') or {}).get('system_id'),
+                        (report.get('severity') or {}).get('severity'),
+                        json.dumps(report),
+                    )
+                    for report in new_reports
+                ],
+            )
+            self.max_report_id = max([self.max_report_id] + [report.get('id', 0) for report in new_reports])
+            self.report_count = self._conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+            self.loaded_at = time.monotonic()
+
+    def refresh(self, api, max_age=SNAPSHOT_MAX_AGE):
+        """
+        Bring the snapshot up to date if it is stale.
+
+        Reports are replaced in full when the snapshot has never been loaded, when it is older than max_age
+        seconds, or when the site's report count has gone down (reports were deleted). When the count has only
+        gone up, the new reports are merged in by id watermark, falling back to a full replace if the counts
+        still disagree afterwards.
+        """
+        with self._lock:
+            if not self.is_loaded():
+                self.load(api, full=True)
+                return True
+            if time.monotonic() - self.loaded_at >= max_age:
+                self._reload_in_full(api)
+                return True
+            try:
+                backend_count = api.get_number_of_reports()
+            except Exception:
+                # Serve the snapshot we have if the backend cannot be reached
+                return False
+            if backend_count == self.report_count:
+                return False
+
+            # The site's reports have changed, so cached site reads are out of date too
+            invalidate_site(self.site_id, self.base_url)
+            incremental = isinstance(backend_count, int) and backend_count > self.report_count
+            if incremental:
+                self.load(api, full=False)
+            if not incremental or self.report_count != backend_count:
+                self._reload_in_full(api)
+            return True
+
+    def _reload_in_full(self, api):
+        # The held report collection only merges new ids, so it is dropped too for deletions and edits to show up
+        invalidate_site(self.site_id, self.base_url)
+        drop_collections(self.site_id, self.base_url)
+        self.load(api, full=True)
+
+    def _rows(self, sql, params=()):
+        with self._lock:
+            return [json.loads(row[0]) for row in self._conn.execute(sql, params).fetchall()]
+
+    def reports_for_asset(self, asset_name, latest_only=False):
+        if latest_only:
+            # Most recent report for each system on the asset
+            return self._rows(
+                """SELECT data FROM reports r WHERE asset_name = ? AND id = (
+                       SELECT id FROM reports WHERE asset_name = r.asset_name AND system_id = r.system_id
+                       ORDER BY date DESC, id DESC LIMIT 1)
+                   ORDER BY system_id""",
+                (asset_name,),
+            )
+        return self._rows("SELECT data FROM reports WHERE asset_name = ? ORDER BY date DESC, id DESC", (asset_name,))
+
+    def assets_for_system(self, system_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT asset_name, asset_id FROM reports WHERE system_id = ? ORDER BY asset_id", (int(system_id),)
+            ).fetchall()
+        return [{'name': name, 'asset_id': asset_id} for name, asset_id in rows]
+
+    def reports_by_severity(self, severity=None, since=None, asset_name=None):
+        clauses, params = [], []
+        if severity is not None:
+            clauses.append("severity = ?")
+            params.append(int(severity))
+        if since:
+            clauses.append("date >= ?")
+            params.append(since)
+        if asset_name:
+            clauses.append("asset_name = ?")
+            params.append(asset_name)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._rows(f"SELECT data FROM reports {where} ORDER BY date DESC, id DESC", params)
+
+    def report_detail(self, report_id):
+        rows = self._rows("SELECT data FROM report_details WHERE id = ?", (int(report_id),))
+        return rows[0] if rows else None
+
+    def store_report_detail(self, report_id, detail):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO report_details (id, data) VALUES (?, ?)", (int(report_id), json.dumps(detail)))
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_snapshot(base_url, site_id):
+    """Return the process-wide snapshot for a site, creating an empty one on first use."""
+    key = (base_url, str(site_id))
+    with _snapshots_lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is None:
+            snapshot = SiteSnapshot(base_url, site_id)
+            _snapshots[key] = snapshot
+        return snapshot
+
+
+def drop_snapshot(site_id=None, base_url=None):
+    """Discard a site's snapshot (every snapshot when site_id is None) so the next query reloads it in full."""
+    with _snapshots_lock:
+        for key in [key for key in _snapshots
+                    if (site_id is None or key[1] == str(site_id)) and (base_url is None or key[0] == base_url)]:
+            del _snapshots[key]
+
+
+class SnapshotApplicationAPI(CachedApplicationAPI):
+    """CachedApplicationAPI that answers per-asset, per-system and per-report lookups from the local site snapshot."""
+
+    def __init__(self, site_id, **kwargs):
+        super().__init__(site_id, **kwargs)
+        self.snapshot = get_snapshot(self.base_url, site_id)
+        self._refreshed = False
+
+    def _ensure_snapshot(self):
+        # Check freshness once per API instance, i.e. once per query
+        if not self._refreshed:
+            self.snapshot.refresh(self)
+            self._refreshed = True
+        return self.snapshot
+
+    def get_all_report_data_from_asset_names(self, asset_name):
+        return self._ensure_snapshot().reports_for_asset(asset_name, latest_only=True)
+
+    def get_all_report_data_from_asset_names_full(self, asset_name):
+        return self._ensure_snapshot().reports_for_asset(asset_name)
+
+    def get_all_asset_names_from_system_id(self, system_ids):
+        return self._ensure_snapshot().assets_for_system(system_ids)
+
+    def get_reports_by_severity(self, severity=None, since=None, asset_name=None):
+        return self._ensure_snapshot().reports_by_severity(severity, since, asset_name)
+
+    def get_single_report_data(self, report_id):
+        detail = self.snapshot.report_detail(report_id)
+        if detail is None:
+            detail = super().get_single_report_data(report_id)
+            self.snapshot.store_report_detail(report_id, detail)
+        return detail
@@ -0,0 +1,30 @@
+import json
+
+from src.services.context import compact_messages, count_tokens
+
+
+def table_result(name, rows):
+    table = {"columns": ["id", "asset", "note"], "rows": [[i, f"F{i}", "x" * 40] for i in range(rows)], "total_rows": rows}
+    return {"role": "system", "name": name, "content": json.dumps(table, separators=(",", ":"))}
+
+
+def test_one_fan_out_turn_is_cut_to_budget():
+    messages = [{"role": "system", "content": "intro"}, {"role": "user", "content": "compare every asset"}]
+    messages += [table_result(f"tool_{i}", 60) for i in range(6)]
+
+    stats = compact_messages(messages, budget=3000, reserved=500)
+
+    assert stats["tokens_after"] <= 3000
+    assert count_tokens(messages) + 500 == stats["tokens_after"]
+    assert stats["truncated"] > 0
+    for message in messages[2:]:
+        table = json.loads(message["content"])
+        assert table["columns"] == ["id", "asset", "note"]
+        assert len(table["rows"]) + table.get("more_available", 0) == 60
+
+
+def test_within_budget_is_untouched():
+    messages = [{"role": "system", "content": "intro"}, table_result("tool", 3)]
+    before = [dict(message) for message in messages]
+    stats = compact_messages(messages, budget=3000, reserved=500)
+    assert messages == before and stats["truncated"] == stats["compacted"] == 0
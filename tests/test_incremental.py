@@ -0,0 +1,22 @@
+import pytest
+
+from src.util.incremental import load_json_stream
+
+
+def test_numbers_split_across_chunks():
+    assert load_json_stream(["  [1.", "5e3, -2]"]) == [1500.0, -2]
+    assert load_json_stream(["[1", "2e", "-1,tr", "ue]"]) == [1.2, True]
+
+
+def test_objects_split_across_chunks():
+    chunks = ['[{"id": 1, "name": "F', '1"}, {"id"', ': 2}]']
+    assert load_json_stream(chunks) == [{"id": 1, "name": "F1"}, {"id": 2}]
+
+
+def test_non_array_document():
+    assert load_json_stream(['{"a":', ' [1, 2]}']) == {"a": [1, 2]}
+
+
+def test_truncated_array_raises():
+    with pytest.raises(ValueError):
+        load_json_stream(["[1, 2"])
@@ -0,0 +1,39 @@
+import json
+
+from src.services.multi_site import merge_site_results
+from src.services.result_shaping import encode_tool_result
+
+REPORT = {
+    "id": 7,
+    "date": "2024-03-01",
+    "asset": {"id": 1, "name": "F1"},
+    "systems": {"system_id": 2, "name": "Gearbox"},
+    "severity": {"severity": 2, "severity_count": 3},
+    "comments": "Check oil",
+}
+
+
+def encoded_rows(function_name, results):
+    table = json.loads(encode_tool_result(function_name, merge_site_results(results)))
+    return [dict(zip(table["columns"], row)) for row in table["rows"]]
+
+
+def test_merged_single_reports_keep_site_and_fields():
+    rows = encoded_rows("get_single_report_data", {1: (REPORT, None), 2: (dict(REPORT, id=8), None)})
+    assert [row["site_id"] for row in rows] == [1, 2]
+    assert [row["id"] for row in rows] == [7, 8]
+    assert all(row["asset"] == "F1" for row in rows)
+
+
+def test_merged_report_lists_keep_site_and_errors():
+    rows = encoded_rows("get_all_report_data_from_asset_names", {
+        1: ([REPORT], None),
+        2: (None, "An error occurred: backend down"),
+    })
+    assert rows[0]["site_id"] == 2 and rows[0]["error"] == "An error occurred: backend down"
+    assert rows[1]["site_id"] == 1 and rows[1]["id"] == 7
+
+
+def test_merged_row_cap_keeps_every_site():
+    merged = merge_site_results({site_id: ([{"id": i} for i in range(5)], None) for site_id in (1, 2, 3)})
+    assert {row["site_id"] for row in merged[:3]} == {1, 2, 3}